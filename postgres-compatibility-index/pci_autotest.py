@@ -1,10 +1,27 @@
 import psycopg2
 from psycopg2 import sql
 from psycopg2 import errors
+import argparse
+import contextlib
+import decimal
+import hashlib
 import json
 import os
+import queue
+import re
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
 from tabulate import tabulate
 
+from pci_benchmark import DEFAULT_INGEST_SCALES, DEFAULT_SCALE, bench_ingest, print_benchmarks, print_ingest, run_benchmarks
+from pci_connect import DEFAULT_CONNECT_SAMPLES, print_connection, probe_connection
+from pci_contention import DEFAULT_DURATION, DEFAULT_SESSIONS, print_contention, run_contention
+from pci_checkpoint import DEFAULT_CHECKPOINT_FILE, Checkpoint
+from pci_cache import DEFAULT_CACHE_FILE, DEFAULT_MAX_TARGETS, DEFAULT_TTL_HOURS, ResultCache, fingerprint
+from pci_store import ResultStore
+from pci_sandbox import DEFAULT_TEMPLATE, EXTENSION_SCHEMA, SANDBOX_MODES, Sandbox, print_sandbox, sandbox_name
+
 # PostgreSQL connection parameters from environment variables or defaults
 PG_HOST = os.getenv("PG_HOST", "localhost")
 PG_PORT = os.getenv("PG_PORT", 5432)
@@ -12,9 +29,16 @@ PG_USER = os.getenv("PG_USER", "postgres")
 PG_PASSWORD = os.getenv("PG_PASSWORD", "password")
 PG_DBNAME = os.getenv("PG_DBNAME", "testdb")
 
-def get_connection():
-    """Establish and return a PostgreSQL connection."""
-    return psycopg2.connect(
+def connection_params(dsn=None):
+    """
+    Connection parameters for the target.
+    A DSN (as used by fleet mode) takes the place of the PG_* settings.
+    """
+    if dsn is not None:
+        params = psycopg2.extensions.parse_dsn(dsn)
+        params.setdefault("sslmode", "require")
+        return params
+    return dict(
         host=PG_HOST,
         port=PG_PORT,
         user=PG_USER,
@@ -25,6 +49,274 @@ def get_connection():
 
     )
 
+def get_connection(dsn=None):
+    """Establish and return a PostgreSQL connection."""
+    return psycopg2.connect(**connection_params(dsn))
+
+class ConnectionPool:
+    """
+    Idle connections kept per DSN so that repeated runs (daemon mode) reuse
+    them instead of connecting afresh. A connection comes back with its
+    transaction rolled back and its session state discarded, and is checked
+    with a round trip before it is handed out again. on_lost, if given, is
+    called for every connection found dead, see lost().
+    """
+
+    def __init__(self, on_lost=None):
+        self.idle = {}
+        self.lock = threading.Lock()
+        self.on_lost = on_lost
+
+    def lost(self):
+        """A connection was found dead: by the pool, or by a session that replaced it (ProbeSession.recover())."""
+        if self.on_lost is not None:
+            self.on_lost()
+
+    def get(self, dsn=None):
+        while True:
+            with self.lock:
+                connections = self.idle.get(dsn)
+                connection = connections.pop() if connections else None
+            if connection is None:
+                return get_connection(dsn)
+            try:
+                with connection.cursor() as cursor:
+                    cursor.execute("SELECT 1;")
+                return connection
+            except psycopg2.Error:
+                connection.close()
+                self.lost()
+
+    def put(self, dsn, connection):
+        if connection.closed:
+            return
+        try:
+            connection.autocommit = True
+            with connection.cursor() as cursor:
+                if connection.get_transaction_status() != psycopg2.extensions.TRANSACTION_STATUS_IDLE:
+                    cursor.execute("ROLLBACK;")
+                cursor.execute("DISCARD ALL;")
+        except psycopg2.Error:
+            connection.close()
+            self.lost()
+            return
+        with self.lock:
+            self.idle.setdefault(dsn, []).append(connection)
+
+    def close(self):
+        with self.lock:
+            connections = [connection for idle in self.idle.values() for connection in idle]
+            self.idle = {}
+        for connection in connections:
+            connection.close()
+
+DEFAULT_PROBE_TIMEOUT = 120  # Seconds a single probe may run before it is cancelled
+
+class ProbeTimeout(Exception):
+    """Raised when a probe reaches its deadline between two statements."""
+
+class ProbeCursor(psycopg2.extensions.cursor):
+    """
+    Cursor that counts round trips and the time spent waiting on execute(),
+    and refuses to start a statement once the probe deadline has passed.
+    """
+
+    round_trip_ms = 0.0  # Baseline network round trip, see measure_round_trip()
+    snapshot = None  # Catalog snapshot shared by the run, see fetch_snapshot()
+    sandbox = None  # Name of the run's Sandbox, see global_name()
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.round_trips = 0
+        self.execute_ms = 0.0
+        self.deadline = None  # time.monotonic() value, set by ProbeSession.run()
+        self.timed_out = False
+
+    def execute(self, query, vars=None):
+        if self.deadline is not None and time.monotonic() >= self.deadline:
+            self.timed_out = True
+            raise ProbeTimeout("probe exceeded its time budget")
+        start = time.perf_counter()
+        try:
+            return super().execute(query, vars)
+        except errors.QueryCanceled:
+            self.timed_out = True
+            raise
+        finally:
+            self.round_trips += 1
+            self.execute_ms += (time.perf_counter() - start) * 1000
+
+class RecordingCursor(ProbeCursor):
+    """
+    ProbeCursor that also logs each statement with its result rows, or with
+    the error it raised, for a Cassette. Rows are read as soon as the
+    statement succeeds and then handed out from the log, so callers see
+    the same rows as on a plain ProbeCursor.
+    """
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.log = []
+        self.rows = []
+
+    def execute(self, query, vars=None):
+        entry = {"query": query}
+        if vars is not None or not isinstance(query, str):
+            entry["query"] = self.mogrify(query, vars).decode()
+        self.rows = []
+        try:
+            super().execute(query, vars)
+        except Exception as e:
+            entry.update(error=type(e).__name__, pgcode=getattr(e, "pgcode", None), message=str(e))
+            self.log.append(entry)
+            raise
+        if self.description is not None:
+            self.rows = super().fetchall()
+            entry["rows"] = self.rows[:]
+        self.log.append(entry)
+
+    def fetchone(self):
+        return self.rows.pop(0) if self.rows else None
+
+    def fetchall(self):
+        rows, self.rows = self.rows, []
+        return rows
+
+def encode_value(value):
+    """json default for recorded rows: Decimals are tagged so replays get Decimals back; anything else is kept as text."""
+    if isinstance(value, decimal.Decimal):
+        return {"__decimal__": str(value)}
+    return str(value)
+
+class Cassette:
+    """
+    What a live run sent and got back, probe by probe, so that the run can
+    be replayed with no server (pci_replay.py): every statement with its
+    result rows or its error (class, SQLSTATE and message), the verdict the
+    probe scored, and the catalog snapshot the probes consulted.
+    """
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.snapshot = None
+        self.sandbox = None
+        self.round_trip_ms = 0.0
+        self.probes = {}
+
+    def record(self, category, subfeature, verdict, statements, skipped=False):
+        with self.lock:
+            self.probes.setdefault(category, {})[subfeature] = {"verdict": verdict, "statements": statements, "skipped": skipped}
+
+    def save(self, path, target):
+        cassette = {"target": target, "recorded_at": time.time(), "feature_set": feature_set_version(), "snapshot": self.snapshot,
+                    "sandbox": self.sandbox, "round_trip_ms": self.round_trip_ms, "probes": self.probes}
+        with open(path, "w") as cassette_file:
+            json.dump(cassette, cassette_file, indent=1, default=encode_value)
+
+def measure_round_trip(cursor, samples=3):
+    """Record the fastest of a few empty round trips as the network baseline."""
+    timings = []
+    for _ in range(samples):
+        start = time.perf_counter()
+        cursor.execute("SELECT 1;")
+        timings.append((time.perf_counter() - start) * 1000)
+    cursor.round_trip_ms = min(timings)
+
+# Settings recorded in the catalog snapshot
+SNAPSHOT_SETTINGS = [
+    "shared_preload_libraries", "wal_level", "max_worker_processes", "max_parallel_workers",
+    "max_parallel_workers_per_gather", "default_transaction_isolation", "server_encoding",
+]
+
+SNAPSHOT_QUERY = """
+SELECT current_setting('server_version'),
+       current_setting('server_version_num'),
+       (SELECT coalesce(json_object_agg(name, installed_version), '{}') FROM pg_available_extensions),
+       (SELECT coalesce(json_object_agg(e.extname, n.nspname), '{}')
+          FROM pg_extension e JOIN pg_namespace n ON n.oid = e.extnamespace),
+       (SELECT coalesce(json_object_agg(name, setting), '{}') FROM pg_settings WHERE name = ANY(%s)),
+       (SELECT row_to_json(r) FROM (SELECT rolname, rolsuper, rolcreaterole, rolcreatedb, rolreplication, rolbypassrls
+                                      FROM pg_roles WHERE rolname = current_user) r);
+"""
+
+def fetch_snapshot(cursor):
+    """
+    Fetch server version, extensions, key settings and the current role's
+    attributes in one round trip. Returns None if the target cannot answer
+    the query, in which case probes ask the server directly.
+    """
+    try:
+        cursor.execute(SNAPSHOT_QUERY, (SNAPSHOT_SETTINGS,))
+        version, version_num, available, installed, settings, role = cursor.fetchone()
+    except psycopg2.Error as e:
+        print(f"Catalog snapshot unavailable, probing the server directly: {e}")
+        if cursor.connection.get_transaction_status() == psycopg2.extensions.TRANSACTION_STATUS_INERROR:
+            cursor.execute("ROLLBACK;")
+        return None
+    return {
+        "server_version": version,
+        "server_version_num": int(version_num),
+        "available_extensions": available,
+        "installed_extensions": installed,
+        "settings": settings,
+        "role": role,
+    }
+
+def target_identity(connection):
+    """host:port/dbname as user, for telling cached targets apart."""
+    params = connection.get_dsn_parameters()
+    return f"{params.get('host')}:{params.get('port')}/{params.get('dbname')} as {params.get('user')}"
+
+def feature_set_version():
+    """Short hash of this file, so cached results go stale whenever a probe changes."""
+    with open(__file__, "rb") as source:
+        return hashlib.sha256(source.read()).hexdigest()[:12]
+
+class ExtensionUnavailable(Exception):
+    """Raised when the catalog snapshot shows an extension cannot be created."""
+
+def extension_available(cursor, name):
+    """
+    True or False from the catalog snapshot, or None when it is not known.
+    An empty pg_available_extensions (some compatible engines do not fill
+    it in) is treated as not known rather than as nothing available.
+    """
+    snapshot = getattr(cursor, "snapshot", None)
+    if not snapshot or not snapshot["available_extensions"]:
+        return None
+    return name in snapshot["available_extensions"]
+
+def require_extension(cursor, name):
+    """Fail the probe without a round trip if the extension is not available."""
+    if extension_available(cursor, name) is False:
+        raise ExtensionUnavailable(f'extension "{name}" is not available')
+
+def create_extension(cursor, name):
+    """
+    CREATE EXTENSION IF NOT EXISTS in the shared EXTENSION_SCHEMA, skipped
+    when the snapshot already answers it. IF NOT EXISTS does not stop two
+    runs creating the same extension at once; the one that loses gets a
+    unique violation once the other has committed, and then finds it there.
+    """
+    require_extension(cursor, name)
+    snapshot = getattr(cursor, "snapshot", None)
+    if snapshot and name in snapshot["installed_extensions"]:
+        return
+    statement = f"CREATE SCHEMA IF NOT EXISTS {EXTENSION_SCHEMA}; CREATE EXTENSION IF NOT EXISTS {name} WITH SCHEMA {EXTENSION_SCHEMA};"
+    try:
+        cursor.execute(statement)
+    except errors.UniqueViolation:
+        cursor.execute(statement)
+
+def global_name(cursor, name):
+    """
+    Name for an object the probes create outside their schema (a schema,
+    publication or role): prefixed with the run's sandbox so that
+    concurrent runs do not collide, or test_<name> outside a sandbox.
+    """
+    sandbox = getattr(cursor, "sandbox", None)
+    return f"{sandbox}_{name}" if sandbox else f"test_{name}"
+
 # Define the features to test
 FEATURES = {
     "data_types": ["Primitive Types", "Complex Types", "JSONB", "Geospatial Types", "Custom Types", "Full-Text Search", "Vector"],
@@ -44,7 +336,7 @@ FEATURES = {
 #    "utilities": ["pg_dump", , "amcheck"]
 }
 
-SUPPORT_SCORES = {"full": 1.0, "partial": 0.5, "no": 0.0}
+SUPPORT_SCORES = {"full": 1.0, "partial": 0.5, "no": 0.0, "timeout": 0.0}
 FEATURE_WEIGHTS = {
     "data_types": 7,
     "DDL_features": 5,
@@ -64,8 +356,38 @@ FEATURE_WEIGHTS = {
 
 PENALTY_PER_FAILURE = 1  # Negative points per failure
 
+# Probes that rely on objects or session state left behind by earlier probes.
+# The parallel scheduler runs each probe on the same connection (and schema)
+# as everything it depends on, in FEATURES order.
+PROBE_DEPENDENCIES = {
+    ("performance", "Index Types"): [("data_types", "Primitive Types"), ("data_types", "JSONB"), ("data_types", "Full-Text Search")],
+    ("security", "GRANT/REVOKE Privileges"): [("data_types", "Primitive Types")],
+    ("security", "Row-Level Security"): [("data_types", "Primitive Types")],
+    ("transaction_features", "ACID Compliance"): [("data_types", "Primitive Types")],
+    # A transaction probe that fails half way leaves an aborted transaction
+    # behind, and "Nested Transactions" never commits, so every later probe
+    # on the session runs inside whatever they left open.
+    ("transaction_features", "Isolation Levels"): [("transaction_features", "ACID Compliance")],
+    ("transaction_features", "Nested Transactions"): [("transaction_features", "Isolation Levels")],
+    ("transaction_features", "Row-Level Locking"): [("data_types", "Primitive Types"), ("transaction_features", "Nested Transactions")],
+    # The miscellaneous probes run after the transaction probes, inside
+    # whatever they left open, as they do in a serial run.
+    ("miscellaneous", "pg_stat_statements"): [("transaction_features", "Row-Level Locking")],
+    ("miscellaneous", "pg_walinspect"): [("miscellaneous", "pg_stat_statements")],
+    ("miscellaneous", "External Programming Language"): [("miscellaneous", "pg_walinspect")],
+}
 
-def test_feature(cursor, feature_category, feature_name):
+# Probes that measure server-wide state (WAL position) and must not overlap
+# with other probes; the parallel path runs them after the pool has drained.
+EXCLUSIVE_PROBES = {("performance", "Unlogged Table")}
+
+
+def test_feature(cursor, feature_category, feature_name, report=print):
+    """
+    Run one probe on cursor and return its verdict. Failures are passed to
+    report, print by default; planning collects them instead, so probes
+    planned on other threads never touch the process-wide stdout.
+    """
     support ="no"
     try:
         # Test each feature based on its category and subfeature
@@ -77,17 +399,20 @@ def test_feature(cursor, feature_category, feature_name):
             elif feature_name == "JSONB":
                 cursor.execute("CREATE TABLE test_jsonb (data JSONB);")
             elif feature_name == "Geospatial Types":
-                cursor.execute("CREATE EXTENSION IF NOT EXISTS postgis; CREATE TABLE test_geo (geom GEOMETRY);")
+                create_extension(cursor, "postgis")
+                cursor.execute("CREATE TABLE test_geo (geom GEOMETRY);")
             elif feature_name == "Custom Types":
                 cursor.execute("CREATE TYPE mood AS ENUM ('happy', 'sad', 'neutral');")
             elif feature_name == "Full-Text Search":
                 cursor.execute("CREATE TABLE test_fts (content TSVECTOR);")
             elif feature_name == "Vector":
-                cursor.execute("CREATE EXTENSION IF NOT EXISTS vector; CREATE TABLE test_vector (embedding VECTOR(3));")
+                create_extension(cursor, "vector")
+                cursor.execute("CREATE TABLE test_vector (embedding VECTOR(3));")
 
         elif feature_category == "DDL_features":
             if feature_name == "Schemas":
-                cursor.execute("DROP SCHEMA IF EXISTS test_schema CASCADE; CREATE SCHEMA test_schema;")
+                schema = global_name(cursor, "schema")
+                cursor.execute(f"DROP SCHEMA IF EXISTS {schema} CASCADE; CREATE SCHEMA {schema};")
             elif feature_name == "Sequences":
                 cursor.execute("CREATE SEQUENCE test_seq START 1;")
             elif feature_name == "Views":
@@ -127,6 +452,8 @@ def test_feature(cursor, feature_category, feature_name):
 
         elif feature_category == "extensions":
             if feature_name == "Extension Support":
+                if extension_available(cursor, "pg_trgm") is not None:
+                    return "full" if extension_available(cursor, "pg_trgm") else "no"
                 #cursor.execute("CREATE EXTENSION IF NOT EXISTS pg_trgm;")
                 cursor.execute("select coalesce((select 1 from pg_available_extensions where name ='pg_trgm'),0)")
                 extensions = cursor.fetchone()[0]
@@ -136,6 +463,8 @@ def test_feature(cursor, feature_category, feature_name):
                     support ="no"
                 return support
             elif feature_name == "Foreign Data Wrappers":
+                if extension_available(cursor, "postgres_fdw") is not None:
+                    return "full" if extension_available(cursor, "postgres_fdw") else "no"
                 #cursor.execute("CREATE EXTENSION IF NOT EXISTS postgres_fdw;")
                 cursor.execute("select coalesce((select 1 from pg_available_extensions where name ='postgres_fdw'),0)")
                 extensions = cursor.fetchone()[0]
@@ -197,11 +526,13 @@ def test_feature(cursor, feature_category, feature_name):
             #if feature_name == "DisableConstraint":
                 #cursor.execute("alter table child disable trigger all;")
             if feature_name == "Exclusion":
-                cursor.execute("CREATE EXTENSION IF NOT EXISTS btree_gist; CREATE TABLE test_exclusion (id int, t text, ts tstzrange, exclude using gist ((case when t ='A' THEN true end) with =,ts with && ));")
+                create_extension(cursor, "btree_gist")
+                cursor.execute("CREATE TABLE test_exclusion (id int, t text, ts tstzrange, exclude using gist ((case when t ='A' THEN true end) with =,ts with && ));")
 
         elif feature_category == "security":
             if feature_name == "Role Management":
-                cursor.execute("CREATE ROLE test_role; DROP ROLE test_role;")
+                role = global_name(cursor, "role")
+                cursor.execute(f"CREATE ROLE {role}; DROP ROLE {role};")
             elif feature_name == "GRANT/REVOKE Privileges":
                 cursor.execute("GRANT SELECT ON test_primitive TO PUBLIC;")
                 support = "partial"
@@ -211,54 +542,58 @@ def test_feature(cursor, feature_category, feature_name):
         elif feature_category == "replication":
             if feature_name == "Logical Replication":
                 cursor.execute("CREATE TABLE test_replication (id INT PRIMARY KEY, value TEXT);")
-                cursor.execute("CREATE PUBLICATION test_pub FOR TABLE test_replication WHERE (id > 10 and value <>'UNKNOWN');")
-                cursor.execute("SELECT pubname, puballtables, pubinsert, pubupdate, pubdelete FROM pg_publication WHERE pubname = 'test_pub';")
+                publication = global_name(cursor, "pub")
+                cursor.execute(f"CREATE PUBLICATION {publication} FOR TABLE test_replication WHERE (id > 10 and value <>'UNKNOWN');")
+                cursor.execute(f"SELECT pubname, puballtables, pubinsert, pubupdate, pubdelete FROM pg_publication WHERE pubname = '{publication}';")
                 result = cursor.fetchone()
-                if result is None or result[0] != 'test_pub':
+                if result is None or result[0] != publication:
                     raise Exception("Logical Replication Publication not found or misconfigured.")
                 else:
-                    cursor.execute("DROP PUBLICATION test_pub;")
+                    cursor.execute(f"DROP PUBLICATION {publication};")
                     return "full"
         
         elif feature_category == "miscellaneous":
             if feature_name == "External Programming Language":
-                cursor.execute("SET search_path TO public, pg_catalog;")
-                cursor.execute("CREATE EXTENSION IF NOT EXISTS unaccent;")
+                # The helpers go in the probe's own schema; the dictionary is
+                # wherever the unaccent extension is installed.
+                create_extension(cursor, "unaccent")
+                cursor.execute("SELECT quote_ident(n.nspname) FROM pg_extension e JOIN pg_namespace n ON n.oid = e.extnamespace "
+                               "WHERE e.extname = 'unaccent';")
+                dictionary = f"{cursor.fetchone()[0]}.unaccent"
                 cursor.execute(
-                     "CREATE OR REPLACE FUNCTION public.immutable_unaccent(regdictionary, text) "
+                     "CREATE OR REPLACE FUNCTION immutable_unaccent(regdictionary, text) "
                      "RETURNS text LANGUAGE c IMMUTABLE PARALLEL SAFE STRICT AS "
                      "'$libdir/unaccent', 'unaccent_dict';"
                    )
                 cursor.execute(
-                     "CREATE OR REPLACE FUNCTION public.f_unaccent(text) "
+                     "CREATE OR REPLACE FUNCTION f_unaccent(text) "
                      "RETURNS text LANGUAGE sql IMMUTABLE PARALLEL SAFE STRICT AS "
-                     "$func$ SELECT public.immutable_unaccent(regdictionary 'public.unaccent', $1) $func$;"
+                     f"$func$ SELECT immutable_unaccent(regdictionary '{dictionary}', $1) $func$;"
                    )
-                cursor.execute("SELECT public.f_unaccent('Crème Brûlée');")                
+                cursor.execute("SELECT f_unaccent('Crème Brûlée');")
                 result = cursor.fetchone()[0]
                 support = "full" if result.strip() == "Creme Brulee" else "no"
             elif feature_name == "pg_stat_statements":
-                cursor.execute("SET search_path TO public;")    
-                cursor.execute("CREATE EXTENSION IF NOT EXISTS pg_stat_statements;")
+                create_extension(cursor, "pg_stat_statements")
                 cursor.execute("SELECT count(*) FROM pg_stat_statements;")
             elif feature_name == "pg_walinspect":
-                cursor.execute("CREATE EXTENSION IF NOT EXISTS pg_walinspect;")
+                create_extension(cursor, "pg_walinspect")
             
 
         # Add similar blocks for other categories...
 
         return "full"
     except errors.SyntaxError as e:
-        print(f"Feature {feature_name} failed in {feature_category}: {e}")
+        report(f"Feature {feature_name} failed in {feature_category}: {e}")
         return support
     except errors.UndefinedFunction  as e:
-        print(f"Feature {feature_name} failed in {feature_category}: {e}")
+        report(f"Feature {feature_name} failed in {feature_category}: {e}")
         return support
     except errors.FeatureNotSupported as e:
-        print(f"Feature {feature_name} failed in {feature_category}: {e}")
+        report(f"Feature {feature_name} failed in {feature_category}: {e}")
         return support
     except Exception as e:
-        print(f"Feature {feature_name} failed in {feature_category}: {e}")
+        report(f"Feature {feature_name} failed in {feature_category}: {e}")
         #cursor.execute('rollback;')
         return support
 
@@ -268,6 +603,8 @@ def calculate_pci(features):
     """
     Calculate the PCI score based on feature test results.
     Failures introduce penalties, and the score is capped at 100%.
+    A probe that timed out scores and is penalised like a failure, but is
+    left out of failed_tests; see timed_out_tests().
     """
     total_score = 0
     total_weight = sum(FEATURE_WEIGHTS.values())
@@ -279,8 +616,9 @@ def calculate_pci(features):
         for subfeature in subfeatures:
             result = features[category][subfeature]
             category_score += SUPPORT_SCORES[result]
-            if result == "no":
+            if result in ("no", "timeout"):
                 penalty += PENALTY_PER_FAILURE
+            if result == "no":
                 failed_tests.append((category, subfeature))
 
         weighted_score = (category_score / len(subfeatures)) * FEATURE_WEIGHTS[category]
@@ -291,7 +629,23 @@ def calculate_pci(features):
     total_score = min(100, total_score)
     return round(total_score, 2), failed_tests
 
-def print_summary(pci_score, failed_tests):
+def timed_out_tests(features):
+    """Return the (category, feature) pairs whose probe ran out of time."""
+    return [(category, subfeature) for category, subfeatures in FEATURES.items()
+            for subfeature in subfeatures if features[category][subfeature] == "timeout"]
+
+def profile_rows(pci_results, timings):
+    """Rows for the --profile table, most expensive probe first."""
+    rows = [
+        (category, subfeature, pci_results[category][subfeature],
+         timing["wall_ms"], timing["round_trips"], timing.get("statements", "-"), timing["server_ms"],
+         "yes" if timing["cached"] else "")
+        for category, subfeatures in timings.items()
+        for subfeature, timing in subfeatures.items()
+    ]
+    return sorted(rows, key=lambda row: row[3], reverse=True)
+
+def print_summary(pci_score, failed_tests, profile=None, timed_out=None):
     """Print a detailed summary of the PCI results."""
     print("\n==================== PCI SUMMARY REPORT ====================")
     print(f"Overall PCI Score: {pci_score}%\n")
@@ -301,38 +655,688 @@ def print_summary(pci_score, failed_tests):
         print(tabulate(failed_tests, headers=["Category", "Feature"], tablefmt="grid"))
     else:
         print("All features passed successfully!\n")
+    if timed_out:
+        print("\nTimed Out Features (scored as failures):\n")
+        print(tabulate(timed_out, headers=["Category", "Feature"], tablefmt="grid"))
+    if profile:
+        print("\nProbe Profile (most expensive first):\n")
+        print(tabulate(profile, headers=["Category", "Feature", "Result", "Wall ms", "Round Trips", "Statements", "Server ms", "Cached"], tablefmt="grid"))
     print("==========================================================\n")
 
-def main():
+def list_probes():
+    """Return every (category, feature) pair in FEATURES order."""
+    return [(category, subfeature) for category, subfeatures in FEATURES.items() for subfeature in subfeatures]
+
+def schedule_probes(probes):
+    """
+    Group probes into chains that must share a connection.
+    Each chain is a connected component of PROBE_DEPENDENCIES, kept in
+    FEATURES order; chains are returned longest first.
+    """
+    parent = {probe: probe for probe in probes}
+
+    def find(probe):
+        while parent[probe] != probe:
+            parent[probe] = parent[parent[probe]]
+            probe = parent[probe]
+        return probe
 
-    connection = get_connection()
-    connection.autocommit = True
-    cursor = connection.cursor()
+    for probe, dependencies in PROBE_DEPENDENCIES.items():
+        for dependency in dependencies:
+            if probe in parent and dependency in parent:
+                parent[find(probe)] = find(dependency)
 
-    # Create a test schema
-    cursor.execute("DROP SCHEMA IF EXISTS pci_test CASCADE;")
-    cursor.execute("CREATE SCHEMA pci_test;")
-    cursor.execute("SET search_path TO pci_test;")
+    chains = {}
+    for probe in probes:
+        chains.setdefault(find(probe), []).append(probe)
+    return sorted(chains.values(), key=len, reverse=True)
 
-    # Run tests
+# One round trip for a whole batch of probes: the statements go in as a JSON
+# array (one array of statements per probe) and each statement runs in its
+# own BEGIN ... EXCEPTION block, i.e. its own savepoint, so a failure rolls
+# back only that statement, ends only that probe, and leaves the rest of the
+# batch running, just as autocommit does on the probe-by-probe path.
+PIPELINE_QUERY = """
+SELECT set_config('pci.pipeline_probes', %s, false), set_config('statement_timeout', %s, true);
+DO $pci_pipeline$
+DECLARE
+    probe jsonb;
+    statement text;
+    position int;
+    failure text;
+    started timestamptz;
+    results jsonb := '[]';
+BEGIN
+    FOR probe IN SELECT value FROM jsonb_array_elements(current_setting('pci.pipeline_probes')::jsonb) LOOP
+        started := clock_timestamp();
+        position := 0;
+        failure := NULL;
+        FOR statement IN SELECT value FROM jsonb_array_elements_text(probe) LOOP
+            BEGIN
+                EXECUTE statement;
+            EXCEPTION WHEN OTHERS THEN
+                failure := SQLERRM;
+            END;
+            EXIT WHEN failure IS NOT NULL;
+            position := position + 1;
+        END LOOP;
+        results := results || jsonb_build_object(
+            'failed_at', CASE WHEN failure IS NULL THEN NULL ELSE position END,
+            'error', failure,
+            'server_ms', extract(epoch FROM clock_timestamp() - started) * 1000);
+    END LOOP;
+    PERFORM set_config('pci.pipeline_results', results::text, false);
+END
+$pci_pipeline$;
+SELECT current_setting('pci.pipeline_results');
+"""
+
+# Transaction control cannot run inside the pipeline's DO block.
+TRANSACTION_CONTROL = re.compile(r"(^|;)\s*(BEGIN|START\s+TRANSACTION|COMMIT|ROLLBACK|SAVEPOINT|RELEASE)\b", re.IGNORECASE)
+
+class ScriptedFailure(Exception):
+    """Stands in for a server error while a probe is being planned."""
+
+class ScriptedCursor:
+    """
+    Cursor for planning: records the statements a probe sends instead of
+    running them, and fails the fail_at'th one if asked to. A probe that
+    reads results or passes parameters cannot be planned.
+    """
+
+    def __init__(self, snapshot=None, fail_at=None, sandbox=None):
+        self.snapshot = snapshot
+        self.sandbox = sandbox
+        self.fail_at = fail_at
+        self.statements = []
+        self.plannable = True
+
+    def execute(self, query, vars=None):
+        if vars is not None or not isinstance(query, str):
+            self.plannable = False
+        if len(self.statements) == self.fail_at:
+            raise ScriptedFailure("planned failure")
+        self.statements.append(query)
+
+    def fetchone(self):
+        self.plannable = False
+        raise ScriptedFailure("results are not available while planning")
+
+    fetchall = fetchone
+
+def plan_probe(category, subfeature, snapshot, sandbox=None):
+    """
+    Work out what a probe sends and how test_feature() scores every outcome,
+    without touching the server: its statements, its verdict when they all
+    succeed, and its verdict when statement N fails. Returns None for probes
+    that read results or control transactions; they run probe by probe.
+    Anything the probe reports without a server error (a failure decided
+    from the catalog snapshot) is kept to be printed when it runs.
+    """
+    messages = []
+    cursor = ScriptedCursor(snapshot, sandbox=sandbox)
+    verdict = test_feature(cursor, category, subfeature, messages.append)
+    if not cursor.plannable or any(TRANSACTION_CONTROL.search(statement) for statement in cursor.statements):
+        return None
+    failure_verdicts = []
+    for position in range(len(cursor.statements)):
+        failing = ScriptedCursor(snapshot, fail_at=position, sandbox=sandbox)
+        failure_verdicts.append(test_feature(failing, category, subfeature, lambda message: None))
+        if not failing.plannable or failing.statements != cursor.statements[:position]:
+            return None
+    return {"statements": cursor.statements, "verdict": verdict, "failure_verdicts": failure_verdicts, "messages": messages}
+
+def plan_pipeline(probes, snapshot, sandbox=None):
+    """{probe: plan_probe()} for the probes that can be sent in a pipelined batch."""
+    plans = {}
+    for category, subfeature in probes:
+        plan = plan_probe(category, subfeature, snapshot, sandbox)
+        if plan is not None:
+            plans[(category, subfeature)] = plan
+    return plans
+
+class ProbeSession:
+    """
+    A connection and scratch schema that probes run on.
+    Each probe gets a deadline (probe_timeout seconds, capped by the run
+    deadline); statement_timeout bounds every statement on the server and a
+    timer cancels whatever is in flight when the deadline passes. If a
+    probe leaves the connection unusable, it is replaced. With a
+    ConnectionPool, the connection is taken from and returned to the pool.
+    With a Cassette, every probe's statements and results are recorded. With
+    a Checkpoint, each outcome is streamed to it as soon as it is known.
+    """
+
+    def __init__(self, dsn=None, schema="pci_test", probe_timeout=None, run_deadline=None, snapshot=None, pool=None,
+                 cassette=None, checkpoint=None):
+        self.dsn = dsn
+        self.schema = schema
+        self.probe_timeout = probe_timeout
+        self.run_deadline = run_deadline
+        self.snapshot = snapshot
+        self.pool = pool
+        self.cassette = cassette
+        self.checkpoint = checkpoint
+        self.connect()
+
+    def connect(self):
+        self.connection = self.pool.get(self.dsn) if self.pool is not None else get_connection(self.dsn)
+        self.connection.autocommit = True
+        self.cursor = self.connection.cursor(cursor_factory=ProbeCursor if self.cassette is None else RecordingCursor)
+        self.cursor.snapshot = self.snapshot
+        self.cursor.sandbox = sandbox_name(self.schema)
+        measure_round_trip(self.cursor)
+
+    def take_snapshot(self):
+        """Fetch the catalog snapshot that this session's probes consult."""
+        self.snapshot = self.cursor.snapshot = fetch_snapshot(self.cursor)
+        return self.snapshot
+
+    def prepare(self):
+        """Create the scratch schema and point the session at it."""
+        self.cursor.execute(sql.SQL("CREATE SCHEMA IF NOT EXISTS {};").format(sql.Identifier(self.schema)))
+        self.configure()
+
+    def configure(self):
+        # Extensions are found in the shared schema, or in public where they were installed beforehand.
+        self.cursor.execute(sql.SQL("SET search_path TO {}, {}, public;").format(sql.Identifier(self.schema),
+                                                                                  sql.Identifier(EXTENSION_SCHEMA)))
+        if self.probe_timeout:
+            self.cursor.execute("SELECT set_config('statement_timeout', %s, false);", (str(int(self.probe_timeout * 1000)),))
+
+    def reset(self):
+        """Close any transaction a probe left open and undo its SETs."""
+        if self.connection.get_transaction_status() != psycopg2.extensions.TRANSACTION_STATUS_IDLE:
+            self.cursor.execute("ROLLBACK;")
+        self.cursor.execute("RESET ALL;")
+        self.configure()
+
+    def deadline(self, probes=1):
+        """When `probes` probes run back to back must be done: their time budgets, capped by the run deadline."""
+        deadlines = []
+        if self.probe_timeout:
+            deadlines.append(time.monotonic() + self.probe_timeout * probes)
+        if self.run_deadline is not None:
+            deadlines.append(self.run_deadline)
+        return min(deadlines) if deadlines else None
+
+    def run(self, category, subfeature):
+        """
+        Run one probe and return its verdict with timings.
+        server_ms is estimated as the time spent in execute() less one
+        baseline round trip per statement sent.
+        """
+        cursor = self.cursor
+        cursor.round_trips = 0
+        cursor.execute_ms = 0.0
+        cursor.timed_out = False
+        cursor.deadline = self.deadline()
+        if self.cassette is not None:
+            cursor.log = []
+        start = time.perf_counter()
+        skipped = cursor.deadline is not None and time.monotonic() >= cursor.deadline
+        if skipped:
+            print(f"Feature {subfeature} skipped in {category}: run time budget exhausted")
+            verdict = "timeout"
+        else:
+            timer = None
+            if cursor.deadline is not None:
+                timer = threading.Timer(cursor.deadline - time.monotonic(), self.cancel)
+                timer.daemon = True
+                timer.start()
+            try:
+                verdict = test_feature(cursor, category, subfeature)
+            finally:
+                if timer is not None:
+                    timer.cancel()
+            if cursor.timed_out:
+                verdict = "timeout"
+        cursor.deadline = None
+        wall_ms = (time.perf_counter() - start) * 1000
+        server_ms = max(0.0, cursor.execute_ms - cursor.round_trips * cursor.round_trip_ms)
+        if self.cassette is not None:
+            self.cassette.record(category, subfeature, verdict, list(cursor.log), skipped)
+        self.recover()
+        # Probe by probe, every statement is its own round trip.
+        return {"verdict": verdict, "wall_ms": round(wall_ms, 2), "round_trips": cursor.round_trips,
+                "statements": cursor.round_trips, "server_ms": round(server_ms, 2), "cached": False}
+
+    def run_batch(self, probes, plans):
+        """
+        Send a run of planned probes in one round trip (PIPELINE_QUERY) and
+        score each from where, if anywhere, its statements failed. Each
+        probe's wall_ms is its server time plus an even share of the batch's
+        network and parsing overhead. Outside autocommit (a probe left a
+        transaction open), or if the batch as a whole fails or times out, the
+        probes run one at a time instead; a failed batch has already been
+        rolled back, so that starts from a clean slate.
+        """
+        if len(probes) < 2 or self.connection.get_transaction_status() != psycopg2.extensions.TRANSACTION_STATUS_IDLE:
+            return {probe: self.run(*probe) for probe in probes}
+        cursor = self.cursor
+        cursor.round_trips = 0
+        cursor.execute_ms = 0.0
+        cursor.timed_out = False
+        # The batch gets the budget of all its probes, on the server as well
+        # (statement_timeout local to the batch's transaction; 0 is no limit).
+        cursor.deadline = self.deadline(len(probes))
+        timer = None
+        timeout_ms = 0
+        if cursor.deadline is not None:
+            timeout_ms = max(1, int((cursor.deadline - time.monotonic()) * 1000))
+            timer = threading.Timer(max(0.0, cursor.deadline - time.monotonic()), self.cancel)
+            timer.daemon = True
+            timer.start()
+        start = time.perf_counter()
+        try:
+            cursor.execute(PIPELINE_QUERY, (json.dumps([plans[probe]["statements"] for probe in probes]), str(timeout_ms)))
+            results = json.loads(cursor.fetchone()[0])
+        except (psycopg2.Error, ProbeTimeout) as e:
+            print(f"Pipelined batch of {len(probes)} probes failed, running them one at a time: {e}")
+            self.recover()
+            return {probe: self.run(*probe) for probe in probes}
+        finally:
+            if timer is not None:
+                timer.cancel()
+            cursor.deadline = None
+        wall_ms = (time.perf_counter() - start) * 1000
+        overhead_ms = max(0.0, wall_ms - sum(result["server_ms"] for result in results)) / len(probes)
+
+        outcomes = {}
+        for index, ((category, subfeature), result) in enumerate(zip(probes, results)):
+            plan = plans[(category, subfeature)]
+            if result["failed_at"] is None:
+                for message in plan["messages"]:
+                    print(message)
+                verdict = plan["verdict"]
+                statements = len(plan["statements"])
+            else:
+                print(f"Feature {subfeature} failed in {category}: {result['error']}")
+                verdict = plan["failure_verdicts"][result["failed_at"]]
+                statements = result["failed_at"] + 1
+            # The batch's one round trip is counted against its first probe.
+            outcomes[(category, subfeature)] = {"verdict": verdict, "wall_ms": round(result["server_ms"] + overhead_ms, 2),
+                                                "round_trips": 1 if index == 0 else 0, "statements": statements,
+                                                "server_ms": round(result["server_ms"], 2), "cached": False}
+        return outcomes
+
+    def run_chain(self, probes, plans=None):
+        """
+        Run probes in order. With plans (plan_pipeline()), consecutive
+        planned probes go to the server together through run_batch().
+        """
+        outcomes = {}
+        batch = []
+        for probe in probes + [None]:
+            if plans is not None and probe in plans:
+                batch.append(probe)
+                continue
+            if batch:
+                self.finish(outcomes, self.run_batch(batch, plans))
+                batch = []
+            if probe is not None:
+                self.finish(outcomes, {probe: self.run(*probe)})
+        return outcomes
+
+    def finish(self, outcomes, finished):
+        outcomes.update(finished)
+        if self.checkpoint is not None:
+            for (category, subfeature), outcome in finished.items():
+                self.checkpoint.append(category, subfeature, outcome)
+
+    def cancel(self):
+        """Deadline timer: ask the server to cancel the statement in flight."""
+        self.cursor.timed_out = True
+        try:
+            self.connection.cancel()
+        except psycopg2.Error as e:
+            print(f"Could not cancel timed out probe: {e}")
+
+    def recover(self):
+        """Replace the connection if a probe (or its cancellation) broke it."""
+        if not self.connection.closed:
+            return
+        print("Connection lost during a probe; reconnecting.")
+        if self.pool is not None:
+            self.pool.lost()
+        self.connect()
+        self.prepare()
+
+    def close(self):
+        self.cursor.close()
+        if self.pool is not None:
+            self.pool.put(self.dsn, self.connection)
+        else:
+            self.connection.close()
+
+def run_serial(session, probes, plans=None):
+    """Run probes one after another on a single session."""
+    return session.run_chain(probes, plans)
+
+def run_parallel(probes, workers, dsn=None, probe_timeout=None, run_deadline=None, snapshot=None, plans=None, schema="pci_test",
+                 pool=None, cassette=None, checkpoint=None):
+    """
+    Run probes on a pool of connections, one schema (<schema>_wN) per worker.
+    Chains from schedule_probes() are handed out longest first; each chain
+    runs start to finish on the worker that picked it up. Chains holding an
+    EXCLUSIVE_PROBES entry run afterwards on their own.
+    """
+    chains = queue.Queue()
+    exclusive_chains = []
+    for chain in schedule_probes(probes):
+        if EXCLUSIVE_PROBES.intersection(chain):
+            exclusive_chains.append(chain)
+        else:
+            chains.put(chain)
+    outcomes = {}
+
+    def worker(number):
+        session = ProbeSession(dsn, f"{schema}_w{number}", probe_timeout, run_deadline, snapshot, pool, cassette, checkpoint)
+        try:
+            session.prepare()
+            while True:
+                try:
+                    chain = chains.get_nowait()
+                except queue.Empty:
+                    break
+                session.reset()
+                outcomes.update(session.run_chain(chain, plans))
+        finally:
+            session.close()
+
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        for future in [executor.submit(worker, number) for number in range(1, workers + 1)]:
+            future.result()
+
+    # The pool has drained; run the exclusive chains with nothing alongside.
+    if exclusive_chains:
+        for chain in exclusive_chains:
+            chains.put(chain)
+        worker(1)
+    return outcomes
+
+def collect_results(outcomes):
+    """
+    Arrange {(category, feature): outcome} into the nested report layout.
+    Returns the verdicts and, keyed the same way, the probe timings.
+    """
     pci_results = {category: {} for category in FEATURES.keys()}
-    for category, subfeatures in FEATURES.items():
-        for subfeature in subfeatures:
-            pci_results[category][subfeature] = test_feature(cursor, category, subfeature)
+    timings = {category: {} for category in FEATURES.keys()}
+    for category, subfeature in list_probes():
+        outcome = dict(outcomes[(category, subfeature)])
+        pci_results[category][subfeature] = outcome.pop("verdict")
+        timings[category][subfeature] = outcome
+    return pci_results, timings
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Run the PostgreSQL Compatibility Index (PCI) probes against a live database.")
+    parser.add_argument("--workers", type=int, default=1,
+                        help="Number of connections to run probes on in parallel (default: 1, serial).")
+    parser.add_argument("--profile", action="store_true",
+                        help="Print per-probe wall time, round trips and server time, most expensive first.")
+    parser.add_argument("--probe-timeout", type=float, default=DEFAULT_PROBE_TIMEOUT,
+                        help=f"Seconds before a probe is cancelled and scored 'timeout' (default: {DEFAULT_PROBE_TIMEOUT}, 0 disables).")
+    parser.add_argument("--run-timeout", type=float, default=0,
+                        help="Seconds for the whole run; probes not finished in time score 'timeout' (default: 0, no limit).")
+    parser.add_argument("--pipeline", action="store_true",
+                        help="Send runs of independent probes to the server in one round trip, each statement in its own savepoint.")
+    parser.add_argument("--contention", action="store_true",
+                        help="Also drive concurrent sessions: SERIALIZABLE conflicts, hot-row FOR UPDATE and a SKIP LOCKED queue.")
+    parser.add_argument("--contention-sessions", type=int, default=DEFAULT_SESSIONS,
+                        help=f"Sessions each --contention workload runs at once (default: {DEFAULT_SESSIONS}).")
+    parser.add_argument("--contention-seconds", type=float, default=DEFAULT_DURATION,
+                        help=f"Seconds the timed --contention workloads run for (default: {DEFAULT_DURATION}).")
+    parser.add_argument("--connection", action="store_true",
+                        help="Also measure connection setup (TCP, TLS, auth), first-query latency and pooler behaviour.")
+    parser.add_argument("--connection-samples", type=int, default=DEFAULT_CONNECT_SAMPLES,
+                        help=f"Connections timed for --connection percentiles (default: {DEFAULT_CONNECT_SAMPLES}).")
+    parser.add_argument("--cold-start-idle", type=parse_seconds, default=[],
+                        help="Comma-separated idle periods in seconds, e.g. 60,300; after each, --connection times a cold connection.")
+    parser.add_argument("--store",
+                        help="Also append the run to this results store (SQLite, see pci_store.py), e.g. pci_results.db.")
+    parser.add_argument("--target", help="Name to record the run under in --store (default: host:port/dbname as user).")
+    parser.add_argument("--sandbox", choices=SANDBOX_MODES, default="schema",
+                        help="Run in a throwaway per-run schema (default) or a throwaway database, dropped afterwards.")
+    parser.add_argument("--sandbox-template", default=DEFAULT_TEMPLATE,
+                        help=f"Template the sandbox database is cloned from with --sandbox database (default: {DEFAULT_TEMPLATE}).")
+    parser.add_argument("--record", metavar="CASSETTE",
+                        help="Record every statement and its result or error to this file, to replay offline with pci_replay.py.")
+    parser.add_argument("--checkpoint", default=DEFAULT_CHECKPOINT_FILE,
+                        help=f"File each probe's verdict and timings are appended to as it finishes (default: {DEFAULT_CHECKPOINT_FILE}).")
+    parser.add_argument("--resume", action="store_true",
+                        help="Keep the checkpoint of an interrupted run and skip the probes it already finished for this target.")
+    parser.add_argument("--no-cache", action="store_true",
+                        help="Run every probe live instead of reusing results for an unchanged target.")
+    parser.add_argument("--cache-file", default=DEFAULT_CACHE_FILE, help=f"Result cache location (default: {DEFAULT_CACHE_FILE}).")
+    parser.add_argument("--cache-ttl", type=float, default=DEFAULT_TTL_HOURS,
+                        help=f"Hours a cached result stays valid (default: {DEFAULT_TTL_HOURS}).")
+    parser.add_argument("--cache-size", type=int, default=DEFAULT_MAX_TARGETS,
+                        help=f"Number of target fingerprints kept in the cache (default: {DEFAULT_MAX_TARGETS}).")
+    parser.add_argument("--benchmark", action="store_true",
+                        help="Also measure parallel speedup, partition pruning and index build throughput (never cached).")
+    parser.add_argument("--benchmark-scale", type=int, default=DEFAULT_SCALE,
+                        help=f"Size multiplier for the benchmark tables (default: {DEFAULT_SCALE}, 100k rows).")
+    parser.add_argument("--ingest", action="store_true",
+                        help="Also measure bulk-load throughput: row-at-a-time INSERT, batched INSERT and COPY, logged vs unlogged.")
+    parser.add_argument("--ingest-scales", type=parse_scales, default=DEFAULT_INGEST_SCALES,
+                        help="Comma-separated row counts to load (default: %s)." % ",".join(map(str, DEFAULT_INGEST_SCALES)))
+    args = parser.parse_args(argv)
+    if args.workers < 1:
+        parser.error("--workers must be at least 1")
+    if args.probe_timeout < 0 or args.run_timeout < 0:
+        parser.error("--probe-timeout and --run-timeout cannot be negative")
+    if args.cache_ttl <= 0 or args.cache_size < 1:
+        parser.error("--cache-ttl must be positive and --cache-size at least 1")
+    if args.benchmark_scale < 1:
+        parser.error("--benchmark-scale must be at least 1")
+    if args.connection_samples < 1:
+        parser.error("--connection-samples must be at least 1")
+    if args.resume and args.record:
+        parser.error("--resume cannot be combined with --record, which needs every probe to run live")
+    if args.contention_sessions < 2 or args.contention_seconds <= 0:
+        parser.error("--contention-sessions must be at least 2 and --contention-seconds positive")
+    return args
+
+def open_cache(args):
+    """The ResultCache selected on the command line, or None with --no-cache."""
+    if args.no_cache:
+        return None
+    return ResultCache(args.cache_file, args.cache_ttl, args.cache_size)
+
+def open_sandbox(dsn=None, mode="schema", template=DEFAULT_TEMPLATE, pool=None):
+    """Open a Sandbox on the target for one run; see pci_sandbox.py."""
+    if pool is None:
+        return Sandbox(get_connection(dsn), connection_params(dsn), mode, template)
+    return Sandbox(pool.get(dsn), connection_params(dsn), mode, template, release=lambda connection: pool.put(dsn, connection))
+
+def run_probes(workers=1, dsn=None, probe_timeout=DEFAULT_PROBE_TIMEOUT, run_timeout=None, cache=None, pipeline=False,
+               sandbox=None, pool=None, cassette=None, checkpoint=None):
+    """Run every probe against one target and return (verdicts, timings)."""
+    if cassette is not None:
+        cache = None
+        pipeline = False
+    if sandbox is None:
+        sandbox = open_sandbox(dsn, pool=pool)
+        try:
+            return run_probes(workers, dsn, probe_timeout, run_timeout, cache, pipeline, sandbox, pool, cassette, checkpoint)
+        finally:
+            print_sandbox(sandbox.teardown())
+
+    run_deadline = time.monotonic() + run_timeout if run_timeout else None
+    session = ProbeSession(sandbox.dsn, sandbox.schema, probe_timeout, run_deadline, pool=pool, cassette=cassette,
+                           checkpoint=checkpoint)
+    snapshot = session.take_snapshot()
+    if cassette is not None:
+        cassette.snapshot = snapshot
+        cassette.sandbox = sandbox.name
+        cassette.round_trip_ms = session.cursor.round_trip_ms
+
+    identity = target_identity(sandbox.connection)
+    resumed = {}
+    if checkpoint is not None and checkpoint.resume and cassette is None:
+        done = checkpoint.read(identity, feature_set_version())
+        for chain in schedule_probes(list_probes()):
+            if all(probe in done and done[probe]["verdict"] != "timeout" for probe in chain):
+                resumed.update({probe: done[probe] for probe in chain})
+        if resumed:
+            print(f"Resuming: {len(resumed)} probes already done for this target.")
+
+    cache_key = None
+    cached = {}
+    if cache is not None:
+        cache_key = fingerprint(identity, snapshot, feature_set_version())
+        hits = cache.lookup(cache_key)
+        for chain in schedule_probes(list_probes()):
+            if all(probe in hits and probe not in resumed for probe in chain):
+                cached.update({probe: dict(hits[probe], cached=True) for probe in chain})
+        if cached:
+            print(f"Reusing {len(cached)} cached results for this target.")
+    if checkpoint is not None:
+        checkpoint.start(sandbox.name, identity, feature_set_version(), len(list_probes()), len(resumed))
+        for (category, subfeature), outcome in cached.items():
+            checkpoint.append(category, subfeature, outcome)
+    probes = [probe for probe in list_probes() if probe not in cached and probe not in resumed]
+    plans = plan_pipeline(probes, snapshot, sandbox.name) if pipeline else None
+
+    if workers > 1:
+        session.close()
+        outcomes = run_parallel(probes, workers, sandbox.dsn, probe_timeout, run_deadline, snapshot, plans,
+                                sandbox.schema, pool, cassette, checkpoint) if probes else {}
+    else:
+        if probes:
+            session.prepare()
+        outcomes = run_serial(session, probes, plans)
+        session.close()
 
-    print(pci_results)
-    # Calculate PCI score
-    pci_score, failed_tests = calculate_pci(pci_results)
-    print_summary(pci_score, failed_tests)
+    if cache is not None:
+        cache.store(cache_key, outcomes)
+    outcomes.update(cached)
+    outcomes.update(resumed)
+    return collect_results(outcomes)
+
+@contextlib.contextmanager
+def bench_session(dsn=None, probe_timeout=DEFAULT_PROBE_TIMEOUT, schema="pci_bench"):
+    """A cursor on its own schema, removed afterwards, for benchmarks."""
+    session = ProbeSession(dsn, schema, probe_timeout)
+    drop = sql.SQL("DROP SCHEMA IF EXISTS {} CASCADE;").format(sql.Identifier(schema))
+    try:
+        session.cursor.execute(drop)
+        session.prepare()
+        yield session.cursor
+    finally:
+        session.reset()
+        session.cursor.execute(drop)
+        session.close()
+
+def parse_scales(value):
+    """argparse type for a comma-separated list of row counts."""
+    try:
+        scales = [int(scale) for scale in value.split(",")]
+    except ValueError:
+        raise argparse.ArgumentTypeError(f"invalid scale list: {value}")
+    if not scales or min(scales) < 1:
+        raise argparse.ArgumentTypeError("scales must be positive row counts")
+    return scales
+
+def parse_seconds(value):
+    """argparse type for a comma-separated list of idle periods in seconds."""
+    try:
+        periods = [float(period) for period in value.split(",")]
+    except ValueError:
+        raise argparse.ArgumentTypeError(f"invalid list of seconds: {value}")
+    if min(periods) < 0:
+        raise argparse.ArgumentTypeError("idle periods cannot be negative")
+    return periods
+
+def write_report(path, pci_score, pci_results, timings=None, benchmarks=None, ingest=None, sandbox=None, connection=None,
+                 contention=None):
+    """
+    Save the score, per-feature verdicts and (optionally) probe timings,
+    benchmarks, ingest results, sandbox timings, connection measurements and
+    contention results as JSON.
+    """
+    report = {"pci_score": pci_score, "details": pci_results}
+    if timings is not None:
+        report["timings"] = timings
+    if benchmarks is not None:
+        report["benchmarks"] = benchmarks
+    if ingest is not None:
+        report["ingest"] = ingest
+    if sandbox is not None:
+        report["sandbox"] = sandbox
+    if connection is not None:
+        report["connection"] = connection
+    if contention is not None:
+        report["contention"] = contention
+    with open(path, "w") as report_file:
+        json.dump(report, report_file, indent=4)
+
+def main(argv=None):
+    args = parse_args(argv)
+
+    sandbox = open_sandbox(mode=args.sandbox, template=args.sandbox_template)
+    target = args.target or target_identity(sandbox.connection)
+    cassette = Cassette() if args.record else None
+    checkpoint = Checkpoint(args.checkpoint, args.resume)
+    try:
+        # Run tests
+        try:
+            pci_results, timings = run_probes(args.workers, probe_timeout=args.probe_timeout, run_timeout=args.run_timeout,
+                                              cache=open_cache(args), pipeline=args.pipeline, sandbox=sandbox, cassette=cassette,
+                                              checkpoint=checkpoint)
+        except (Exception, KeyboardInterrupt):
+            if checkpoint.done:
+                print(f"Run interrupted after {checkpoint.done} probes; they are kept in {args.checkpoint}, "
+                      "re-run with --resume to skip them.")
+            raise
+        finally:
+            checkpoint.close()
+        if cassette is not None:
+            cassette.save(args.record, target)
+            print(f"Recorded {len(list_probes())} probes to {args.record}; replay them with pci_replay.py {args.record}.")
+        print(pci_results)
+        # Calculate PCI score
+        pci_score, failed_tests = calculate_pci(pci_results)
+        print_summary(pci_score, failed_tests, profile_rows(pci_results, timings) if args.profile else None,
+                      timed_out_tests(pci_results))
+
+        benchmarks = None
+        if args.benchmark:
+            with bench_session(sandbox.dsn, args.probe_timeout, f"{sandbox.schema}_bench") as cursor:
+                benchmarks = run_benchmarks(cursor, args.benchmark_scale)
+            print_benchmarks(benchmarks)
+
+        ingest = None
+        if args.ingest:
+            with bench_session(sandbox.dsn, args.probe_timeout, f"{sandbox.schema}_bench") as cursor:
+                ingest = bench_ingest(cursor, args.ingest_scales)
+            print_ingest(ingest)
+
+        contention = None
+        if args.contention:
+            schema = f"{sandbox.schema}_contention"
+            with bench_session(sandbox.dsn, args.probe_timeout, schema) as cursor:
+                contention = run_contention(cursor, lambda: get_connection(sandbox.dsn), schema, args.contention_sessions,
+                                            args.contention_seconds, args.probe_timeout)
+            print_contention(contention, pci_results["transaction_features"])
+    finally:
+        sandbox_report = sandbox.teardown()
+        print_sandbox(sandbox_report)
+
+    connection = None
+    if args.connection:
+        connection = probe_connection(connection_params(), get_connection, args.connection_samples, args.cold_start_idle)
+        print_connection(connection)
 
     # Save results
-    with open("pci_report.json", "w") as report_file:
-        json.dump({"pci_score": pci_score, "details": pci_results}, report_file, indent=4)
+    write_report("pci_report.json", pci_score, pci_results, timings, benchmarks, ingest, sandbox_report, connection, contention)
+    if args.store:
+        store = ResultStore(args.store)
+        store.record(target, pci_score, pci_results, timings, feature_set_version(), source="pci_report.json")
+        store.close()
+        print(f"Run recorded in {args.store} as '{target}'.")
 
     print("PCI testing completed. Report saved as 'pci_report.json'.")
 
-    cursor.close()
-    connection.close()
-
 if __name__ == "__main__":
     main()
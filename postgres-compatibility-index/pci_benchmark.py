@@ -0,0 +1,343 @@
+import io
+import json
+import time
+
+from psycopg2 import sql
+from psycopg2.extras import execute_values
+import psycopg2
+from tabulate import tabulate
+
+DEFAULT_SCALE = 1
+ROWS_PER_SCALE = 100000  # Rows in each benchmark table at scale 1
+PARTITIONS_PER_SCALE = 20  # Partitions of the pruning benchmark's test_part at scale 1
+PARALLEL_WORKERS = 4  # max_parallel_workers_per_gather for the parallel run
+PARALLEL_SPEEDUP_TARGET = 1.5  # Speedup over workers=0 needed for full marks
+REPEATS = 3  # Each timed query runs this many times; the fastest run counts
+
+# Index methods exercised by the "Index Types" probe and the column each one indexes
+INDEX_TYPES = [("btree", "id"), ("gin", "data"), ("gist", "content"), ("hash", "id")]
+
+DEFAULT_INGEST_SCALES = [1000, 10000, 100000]  # Rows loaded per ingest run
+INGEST_PAYLOAD = 100  # Characters of text per ingested row
+INGEST_BATCH_SIZE = 1000  # Rows per statement for batched INSERT
+ROW_AT_A_TIME_MAX_ROWS = 10000  # Larger scales skip row-at-a-time INSERT (one round trip per row)
+
+
+def explain_analyze(cursor, query):
+    """Run EXPLAIN (ANALYZE, FORMAT JSON) and return the top-level plan object."""
+    cursor.execute("EXPLAIN (ANALYZE, FORMAT JSON) " + query)
+    plan = cursor.fetchone()[0]
+    if isinstance(plan, str):
+        plan = json.loads(plan)
+    return plan[0]
+
+
+def fastest_plan(cursor, query, repeats=REPEATS):
+    """The EXPLAIN ANALYZE result with the lowest execution time out of `repeats` runs."""
+    return min((explain_analyze(cursor, query) for _ in range(repeats)), key=lambda plan: plan["Execution Time"])
+
+
+def plan_nodes(node):
+    """Yield a plan node and every node below it."""
+    yield node
+    for child in node.get("Plans", []):
+        yield from plan_nodes(child)
+
+
+def timed(cursor, query, vars=None):
+    """Execute a statement and return its duration in ms, less one network round trip."""
+    start = time.perf_counter()
+    cursor.execute(query, vars)
+    elapsed = (time.perf_counter() - start) * 1000
+    return max(0.0, elapsed - getattr(cursor, "round_trip_ms", 0.0))
+
+
+def bench_parallel(cursor, rows):
+    """
+    Aggregate over `rows` rows with max_parallel_workers_per_gather = 0 and
+    then PARALLEL_WORKERS, with the parallel cost model zeroed so the planner
+    chooses a Gather wherever the engine supports one.
+    """
+    cursor.execute(sql.SQL("""DROP TABLE IF EXISTS bench_parallel;
+                              CREATE TABLE bench_parallel AS SELECT g AS id, md5(g::text) AS payload FROM generate_series(1, {}) g;
+                              ANALYZE bench_parallel;""").format(sql.Literal(rows)))
+    query = "SELECT count(*), sum(length(payload)) FROM bench_parallel"
+    cursor.execute("SET parallel_setup_cost = 0; SET parallel_tuple_cost = 0; SET min_parallel_table_scan_size = 0;")
+    try:
+        cursor.execute("SET max_parallel_workers_per_gather = 0;")
+        serial = fastest_plan(cursor, query)
+        cursor.execute(sql.SQL("SET max_parallel_workers = {0}; SET max_parallel_workers_per_gather = {0};").format(sql.Literal(PARALLEL_WORKERS)))
+        parallel = fastest_plan(cursor, query)
+    finally:
+        cursor.execute("""RESET parallel_setup_cost; RESET parallel_tuple_cost; RESET min_parallel_table_scan_size;
+                          RESET max_parallel_workers; RESET max_parallel_workers_per_gather;""")
+    gathers = [node for node in plan_nodes(parallel["Plan"]) if node["Node Type"] in ("Gather", "Gather Merge")]
+    return {
+        "rows": rows,
+        "workers_planned": sum(node.get("Workers Planned", 0) for node in gathers),
+        "workers_launched": sum(node.get("Workers Launched", 0) for node in gathers),
+        "gather_in_plan": bool(gathers),
+        "serial_ms": round(serial["Execution Time"], 2),
+        "parallel_ms": round(parallel["Execution Time"], 2),
+        "speedup": round(serial["Execution Time"] / parallel["Execution Time"], 2) if parallel["Execution Time"] else None,
+    }
+
+
+def bench_partition_pruning(cursor, rows, partitions):
+    """
+    Point lookup on a range-partitioned test_part, planned with partition
+    pruning on and then off (constraint exclusion off too, so nothing else
+    removes partitions).
+    """
+    width = -(-rows // partitions)
+    statements = ["DROP TABLE IF EXISTS test_part CASCADE;", "CREATE TABLE test_part (id INT) PARTITION BY RANGE (id);"]
+    for number in range(partitions):
+        statements.append(f"CREATE TABLE test_part{number + 1} PARTITION OF test_part "
+                          f"FOR VALUES FROM ({number * width + 1}) TO ({(number + 1) * width + 1});")
+    statements.append(f"INSERT INTO test_part SELECT generate_series(1, {rows});")
+    statements.append("ANALYZE test_part;")
+    cursor.execute("\n".join(statements))
+
+    query = f"SELECT * FROM test_part WHERE id = {rows // 2}"
+    pruned = fastest_plan(cursor, query)
+    cursor.execute("SET enable_partition_pruning = off; SET constraint_exclusion = off;")
+    try:
+        unpruned = fastest_plan(cursor, query)
+    finally:
+        cursor.execute("RESET enable_partition_pruning; RESET constraint_exclusion;")
+
+    def scanned(plan):
+        return sum(1 for node in plan_nodes(plan["Plan"]) if node.get("Relation Name", "").startswith("test_part"))
+
+    return {
+        "rows": rows,
+        "partitions": partitions,
+        "pruned": {"partitions_scanned": scanned(pruned), "planning_ms": round(pruned["Planning Time"], 3),
+                   "execution_ms": round(pruned["Execution Time"], 3)},
+        "unpruned": {"partitions_scanned": scanned(unpruned), "planning_ms": round(unpruned["Planning Time"], 3),
+                     "execution_ms": round(unpruned["Execution Time"], 3)},
+    }
+
+
+def bench_index_build(cursor, rows):
+    """Build each index type from the "Index Types" probe over `rows` rows and time it."""
+    cursor.execute(sql.SQL("""DROP TABLE IF EXISTS bench_index;
+                              CREATE TABLE bench_index AS
+                                SELECT g AS id,
+                                       jsonb_build_object('k', g, 'tag', g % 100) AS data,
+                                       to_tsvector('simple', 'row ' || g || ' tag ' || (g % 100)) AS content
+                                FROM generate_series(1, {}) g;
+                              ANALYZE bench_index;""").format(sql.Literal(rows)))
+    builds = {}
+    for method, column in INDEX_TYPES:
+        try:
+            elapsed = timed(cursor, sql.SQL("CREATE INDEX {} ON bench_index USING {} ({});").format(
+                sql.Identifier(f"bench_{method}"), sql.SQL(method), sql.Identifier(column)))
+            builds[method] = {"build_ms": round(elapsed, 2),
+                              "rows_per_second": round(rows / (elapsed / 1000)) if elapsed else None}
+        except psycopg2.Error as e:
+            builds[method] = {"error": str(e).strip()}
+    return {"rows": rows, "indexes": builds}
+
+
+def benchmark_score(results):
+    """
+    Sub-score (0-100) for the performance benchmarks, averaged over:
+    parallel query - 1 for a launched Gather reaching PARALLEL_SPEEDUP_TARGET, 0.5 for a Gather without it;
+    partition pruning - 1 when pruning scans a single partition and plans plus runs no slower than
+    without it, 0.5 when it only scans fewer partitions;
+    index build - the share of INDEX_TYPES that built.
+    A benchmark that errored scores 0.
+    """
+    scores = []
+
+    parallel = results.get("parallel_query", {})
+    if parallel.get("workers_launched") and (parallel.get("speedup") or 0) >= PARALLEL_SPEEDUP_TARGET:
+        scores.append(1.0)
+    elif parallel.get("gather_in_plan"):
+        scores.append(0.5)
+    else:
+        scores.append(0.0)
+
+    pruning = results.get("partition_pruning", {})
+    if "pruned" in pruning:
+        pruned, unpruned = pruning["pruned"], pruning["unpruned"]
+        if pruned["partitions_scanned"] == 1 and \
+                pruned["planning_ms"] + pruned["execution_ms"] <= unpruned["planning_ms"] + unpruned["execution_ms"]:
+            scores.append(1.0)
+        elif pruned["partitions_scanned"] < unpruned["partitions_scanned"]:
+            scores.append(0.5)
+        else:
+            scores.append(0.0)
+    else:
+        scores.append(0.0)
+
+    builds = results.get("index_build", {}).get("indexes", {})
+    scores.append(sum(1 for build in builds.values() if "error" not in build) / len(INDEX_TYPES))
+
+    return round(sum(scores) / len(scores) * 100, 2)
+
+
+def ingest_rows(rows):
+    """The rows every ingest method loads, shaped like the Unlogged Table probe's table."""
+    payload = "x" * INGEST_PAYLOAD
+    return [(number, "N", payload) for number in range(1, rows + 1)]
+
+
+def copy_buffer(rows):
+    """Rows as COPY text format in an in-memory buffer."""
+    return io.StringIO("".join(f"{number}\t{flag}\t{text}\n" for number, flag, text in rows))
+
+
+def current_wal_lsn(cursor):
+    """The server's current WAL position, or None where it cannot be read."""
+    try:
+        cursor.execute("SELECT pg_current_wal_lsn();")
+        return cursor.fetchone()[0]
+    except psycopg2.Error:
+        return None
+
+
+def wal_bytes_since(cursor, lsn):
+    if lsn is None:
+        return None
+    cursor.execute("SELECT pg_wal_lsn_diff(pg_current_wal_lsn(), %s);", (lsn,))
+    return int(cursor.fetchone()[0])
+
+
+def load_row_at_a_time(cursor, table, rows):
+    statement = sql.SQL("INSERT INTO {} VALUES (%s, %s, %s);").format(sql.Identifier(table))
+    for row in rows:
+        cursor.execute(statement, row)
+
+
+def load_batched(cursor, table, rows):
+    execute_values(cursor, sql.SQL("INSERT INTO {} VALUES %s;").format(sql.Identifier(table)).as_string(cursor),
+                   rows, page_size=INGEST_BATCH_SIZE)
+
+
+def load_copy(cursor, table, rows):
+    cursor.copy_expert(sql.SQL("COPY {} FROM STDIN;").format(sql.Identifier(table)), copy_buffer(rows))
+
+
+INGEST_METHODS = [("row-at-a-time INSERT", load_row_at_a_time), ("batched INSERT", load_batched), ("COPY", load_copy)]
+
+
+INGEST_TABLES = [("logged", "ingest_logged", "CREATE TABLE"), ("unlogged", "ingest_unlogged", "CREATE UNLOGGED TABLE")]
+
+
+def bench_ingest(cursor, scales=DEFAULT_INGEST_SCALES):
+    """
+    Load each scale's rows with every INGEST_METHODS entry into a logged and
+    an unlogged table, and measure rows/s, MB/s (of COPY text) and WAL
+    bytes per row. WAL is read server-wide, so other activity adds noise.
+    A table that cannot be created or a load that fails is recorded as an
+    error for that method, table and scale.
+    """
+    created = {}
+    for kind, table, create in INGEST_TABLES:
+        try:
+            cursor.execute(sql.SQL("DROP TABLE IF EXISTS {0}; {1} {0} (n INT PRIMARY KEY, flag CHAR, text TEXT);").format(
+                sql.Identifier(table), sql.SQL(create)))
+            created[kind] = None
+        except psycopg2.Error as e:
+            print(f"Ingest benchmark cannot create the {kind} table: {e}")
+            created[kind] = str(e).strip()
+    runs = []
+    for rows_wanted in scales:
+        rows = ingest_rows(rows_wanted)
+        megabytes = len(copy_buffer(rows).getvalue().encode()) / (1024 * 1024)
+        for method, load in INGEST_METHODS:
+            if load is load_row_at_a_time and rows_wanted > ROW_AT_A_TIME_MAX_ROWS:
+                continue
+            for kind, table, _ in INGEST_TABLES:
+                run = {"method": method, "table": kind, "rows": rows_wanted}
+                runs.append(run)
+                if created[kind] is not None:
+                    run["error"] = created[kind]
+                    continue
+                try:
+                    cursor.execute(sql.SQL("TRUNCATE {};").format(sql.Identifier(table)))
+                    lsn = current_wal_lsn(cursor)
+                    start = time.perf_counter()
+                    load(cursor, table, rows)
+                    seconds = time.perf_counter() - start
+                    wal_bytes = wal_bytes_since(cursor, lsn)
+                except psycopg2.Error as e:
+                    print(f"Ingest benchmark {method} into the {kind} table at {rows_wanted} rows failed: {e}")
+                    run["error"] = str(e).strip()
+                    continue
+                run.update({
+                    "seconds": round(seconds, 3),
+                    "rows_per_second": round(rows_wanted / seconds),
+                    "mb_per_second": round(megabytes / seconds, 2),
+                    "wal_bytes_per_row": round(wal_bytes / rows_wanted, 1) if wal_bytes is not None else None,
+                })
+    try:
+        cursor.execute("DROP TABLE IF EXISTS ingest_logged, ingest_unlogged;")
+    except psycopg2.Error as e:
+        print(f"Ingest benchmark cannot drop its tables: {e}")
+    return {"scales": list(scales), "payload_chars": INGEST_PAYLOAD, "runs": runs}
+
+
+def print_ingest(results):
+    """Print the ingest measurements as a table."""
+    rows = [(run["method"], run["table"], run["rows"], run["error"], "", "") if "error" in run else
+            (run["method"], run["table"], run["rows"], run["rows_per_second"], run["mb_per_second"], run["wal_bytes_per_row"])
+            for run in results["runs"]]
+    print(f"\nIngest Throughput ({results['payload_chars']}-character rows; row-at-a-time INSERT up to {ROW_AT_A_TIME_MAX_ROWS} rows):\n")
+    print(tabulate(rows, headers=["Method", "Table", "Rows", "Rows/s", "MB/s", "WAL Bytes/Row"], tablefmt="grid"))
+
+
+BENCHMARKS = [
+    ("parallel_query", lambda cursor, scale: bench_parallel(cursor, ROWS_PER_SCALE * scale)),
+    ("partition_pruning", lambda cursor, scale: bench_partition_pruning(cursor, ROWS_PER_SCALE * scale, PARTITIONS_PER_SCALE * scale)),
+    ("index_build", lambda cursor, scale: bench_index_build(cursor, ROWS_PER_SCALE * scale)),
+]
+
+
+def run_benchmarks(cursor, scale=DEFAULT_SCALE):
+    """
+    Run every benchmark on an autocommit cursor whose search_path points at
+    a scratch schema, and return the measurements plus a sub-score.
+    """
+    results = {"scale": scale}
+    for name, benchmark in BENCHMARKS:
+        try:
+            results[name] = benchmark(cursor, scale)
+        except psycopg2.Error as e:
+            print(f"Benchmark {name} failed: {e}")
+            results[name] = {"error": str(e).strip()}
+    results["score"] = benchmark_score(results)
+    return results
+
+
+def print_benchmarks(results):
+    """Print the benchmark measurements as a table."""
+    rows = []
+    parallel = results["parallel_query"]
+    if "error" in parallel:
+        rows.append(("Parallel Query Execution", parallel["error"]))
+    else:
+        rows.append(("Parallel Query Execution",
+                     f"{parallel['serial_ms']} ms -> {parallel['parallel_ms']} ms with {parallel['workers_launched']} workers "
+                     f"(x{parallel['speedup']})"))
+    pruning = results["partition_pruning"]
+    if "error" in pruning:
+        rows.append(("Partition Pruning", pruning["error"]))
+    else:
+        for variant in ("pruned", "unpruned"):
+            measured = pruning[variant]
+            rows.append((f"Partition Pruning ({variant})",
+                         f"{measured['partitions_scanned']}/{pruning['partitions']} partitions, "
+                         f"plan {measured['planning_ms']} ms, run {measured['execution_ms']} ms"))
+    builds = results["index_build"]
+    if "error" in builds:
+        rows.append(("Index Build", builds["error"]))
+    else:
+        for method, build in builds["indexes"].items():
+            rows.append((f"Index Build ({method})",
+                         build.get("error") or f"{build['build_ms']} ms, {build['rows_per_second']} rows/s"))
+
+    print(f"\nPerformance Benchmarks (scale {results['scale']}, sub-score {results['score']}/100):\n")
+    print(tabulate(rows, headers=["Benchmark", "Measurement"], tablefmt="grid"))
@@ -0,0 +1,108 @@
+import hashlib
+import json
+import os
+import threading
+import time
+
+DEFAULT_CACHE_FILE = "pci_cache.json"
+DEFAULT_TTL_HOURS = 168  # A week, so nightly runs keep hitting the cache
+DEFAULT_MAX_TARGETS = 64  # Fingerprints kept before the least recently used is evicted
+
+
+def fingerprint(target, snapshot, feature_set):
+    """
+    Hash what a probe verdict depends on: the target, its server version,
+    installed and available extensions, key settings, the connecting role
+    and the probe definitions themselves (feature_set).
+    Returns None when there is no catalog snapshot to fingerprint.
+    """
+    if snapshot is None:
+        return None
+    material = {
+        "target": target,
+        "feature_set": feature_set,
+        "server_version": snapshot["server_version"],
+        "available_extensions": snapshot["available_extensions"],
+        "installed_extensions": snapshot["installed_extensions"],
+        "settings": snapshot["settings"],
+        "role": snapshot["role"],
+    }
+    return hashlib.sha256(json.dumps(material, sort_keys=True).encode()).hexdigest()
+
+
+class ResultCache:
+    """
+    Probe outcomes on disk, keyed by fingerprint() and then by probe.
+    Each outcome expires ttl_hours after it was measured; beyond max_targets
+    fingerprints, the least recently used one is dropped. Safe to share
+    between threads (fleet mode).
+    """
+
+    def __init__(self, path=DEFAULT_CACHE_FILE, ttl_hours=DEFAULT_TTL_HOURS, max_targets=DEFAULT_MAX_TARGETS):
+        self.path = path
+        self.ttl = ttl_hours * 3600
+        self.max_targets = max_targets
+        self.lock = threading.Lock()
+        self.entries = self.load()
+
+    def load(self):
+        try:
+            with open(self.path, "r") as file:
+                return json.load(file).get("entries", {})
+        except FileNotFoundError:
+            return {}
+        except (ValueError, AttributeError) as e:
+            print(f"Ignoring unreadable cache {self.path}: {e}")
+            return {}
+
+    def save(self):
+        temporary = f"{self.path}.tmp"
+        with open(temporary, "w") as file:
+            json.dump({"entries": self.entries}, file)
+        os.replace(temporary, self.path)
+
+    def lookup(self, key):
+        """Return {(category, feature): outcome} for the unexpired outcomes under key."""
+        if key is None:
+            return {}
+        now = time.time()
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is None:
+                return {}
+            entry["used_at"] = now
+            return {
+                (category, subfeature): {name: value for name, value in outcome.items() if name != "stored_at"}
+                for category, subfeatures in entry["outcomes"].items()
+                for subfeature, outcome in subfeatures.items()
+                if now - outcome["stored_at"] < self.ttl
+            }
+
+    def store(self, key, outcomes):
+        """Record freshly measured outcomes under key, then evict and save."""
+        if key is None:
+            return
+        now = time.time()
+        with self.lock:
+            entry = self.entries.setdefault(key, {"outcomes": {}})
+            entry["used_at"] = now
+            for (category, subfeature), outcome in outcomes.items():
+                # A timeout says nothing about the feature; measure it again next time.
+                if outcome["verdict"] == "timeout":
+                    continue
+                stored = {name: value for name, value in outcome.items() if name != "cached"}
+                stored["stored_at"] = now
+                entry["outcomes"].setdefault(category, {})[subfeature] = stored
+            self.evict(now)
+            self.save()
+
+    def evict(self, now):
+        for entry in self.entries.values():
+            for subfeatures in entry["outcomes"].values():
+                for subfeature in [name for name, outcome in subfeatures.items() if now - outcome["stored_at"] >= self.ttl]:
+                    del subfeatures[subfeature]
+        for key in [key for key, entry in self.entries.items() if not any(entry["outcomes"].values())]:
+            del self.entries[key]
+        by_age = sorted(self.entries, key=lambda key: self.entries[key]["used_at"])
+        for key in by_age[:max(0, len(by_age) - self.max_targets)]:
+            del self.entries[key]
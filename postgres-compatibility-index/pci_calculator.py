@@ -1,5 +1,8 @@
 import json
 import argparse
+import csv
+import heapq
+import os
 import sys
 
 # Standardized PostgreSQL feature set with categories and sub-features
@@ -39,6 +42,10 @@ FEATURE_WEIGHTS = {
 
 # Scoring system
 SUPPORT_SCORES = {"full": 1.0, "partial": 0.5, "no": 0.0}
+# With --lenient, a probe that timed out in pci_autotest scores as a failure there too
+LENIENT_SCORES = dict(SUPPORT_SCORES, timeout=0.0)
+
+BATCH_CHUNK_SIZE = 1024  # Inputs scored together; memory use is bounded by this, not by the input count
 
 def validate_input(features):
     """
@@ -67,12 +74,231 @@ def calculate_pci(features):
 
     return round(total_score, 2)
 
+def compile_features():
+    """
+    Flatten STANDARD_FEATURES into one sub-feature order, plus each category's
+    (start, end) slice of it; inputs are encoded against this order once and
+    then scored under any number of weight variants.
+    """
+    order = []
+    slices = []
+    for subfeatures in STANDARD_FEATURES.values():
+        slices.append((len(order), len(order) + len(subfeatures)))
+        order.extend(subfeatures)
+    return order, slices
+
+def compile_weights(variants):
+    """
+    Turn {variant: {category: weight}} into {variant: [weight per category]}.
+    A variant only needs the categories it changes; the rest keep FEATURE_WEIGHTS.
+    """
+    compiled = {"default": [FEATURE_WEIGHTS[category] for category in STANDARD_FEATURES]}
+    for name, overrides in variants.items():
+        unknown = set(overrides) - set(STANDARD_FEATURES)
+        if unknown:
+            raise ValueError(f"Unknown categories in weight variant '{name}': {', '.join(sorted(unknown))}")
+        weights = dict(FEATURE_WEIGHTS, **overrides)
+        compiled[name] = [weights[category] for category in STANDARD_FEATURES]
+    return compiled
+
+def encode_features(features, lenient=False):
+    """
+    Encode one input as a flat list of support scores in compile_features() order.
+    Accepts a bare feature dict or a report with the features under "details".
+    With lenient, missing categories and sub-features score "no" and "timeout"
+    scores 0.0 instead of failing validation, so older reports with a different
+    feature set, and automated reports with timed-out probes, can be scored.
+    """
+    if "details" in features and isinstance(features["details"], dict):
+        features = features["details"]
+    features = {category.lower(): subfeatures for category, subfeatures in features.items()}
+    if not lenient:
+        validate_input(features)
+    scores = LENIENT_SCORES if lenient else SUPPORT_SCORES
+    encoded = []
+    for category, subfeatures in STANDARD_FEATURES.items():
+        results = features.get(category, {})
+        for subfeature in subfeatures:
+            result = results.get(subfeature, "no")
+            if result not in scores:
+                raise ValueError(f"Invalid support level '{result}' for {subfeature}. Use {', '.join(repr(level) for level in scores)}.")
+            encoded.append(scores[result])
+    return encoded
+
+def category_averages(rows, slices):
+    """
+    One pass over encoded rows: each row's average support per category. A
+    chunk's averages are shared by every weight variant instead of being
+    summed again for each one.
+    """
+    return [[sum(row[start:end]) / (end - start) for start, end in slices] for row in rows]
+
+def score_chunk(averages, weights):
+    """
+    Score a chunk's category_averages() under one weight variant. This is a
+    plain Python loop, one weighted sum per row; sums run in the same order
+    as calculate_pci(), so a single input scores exactly as it does there.
+    """
+    scores = []
+    for row in averages:
+        total_score = 0
+        for average, weight in zip(row, weights):
+            total_score += average * weight
+        scores.append(round(total_score, 2))
+    return scores
+
+def iter_inputs(path):
+    """
+    Yield (name, features) one input at a time from a directory of JSON files
+    (named after the file) or a JSONL file (each line either a feature dict or
+    {"name": ..., "features": {...}}). Unreadable inputs yield the exception.
+    """
+    if os.path.isdir(path):
+        for entry in sorted(os.scandir(path), key=lambda entry: entry.name):
+            if not entry.name.endswith(".json"):
+                continue
+            name = entry.name[:-len(".json")]
+            try:
+                with open(entry.path, "r") as file:
+                    yield name, json.load(file)
+            except (OSError, ValueError) as e:
+                yield name, e
+        return
+    with open(path, "r") as file:
+        for number, line in enumerate(file, start=1):
+            if not line.strip():
+                continue
+            try:
+                record = json.loads(line)
+            except ValueError as e:
+                yield f"line {number}", e
+                continue
+            if "features" in record:
+                yield record.get("name", f"line {number}"), record["features"]
+            else:
+                yield record.get("name", f"line {number}"), record
+
+def iter_chunks(items, size=BATCH_CHUNK_SIZE):
+    chunk = []
+    for item in items:
+        chunk.append(item)
+        if len(chunk) == size:
+            yield chunk
+            chunk = []
+    if chunk:
+        yield chunk
+
+def score_batch(path, variants, lenient=False):
+    """
+    Stream inputs from path and yield one result per input:
+    {"name": ..., "scores": {variant: score}} or {"name": ..., "error": ...}.
+    """
+    _, slices = compile_features()
+    for chunk in iter_chunks(iter_inputs(path)):
+        names, rows, errors = [], [], []
+        for name, features in chunk:
+            try:
+                if isinstance(features, Exception):
+                    raise features
+                rows.append(encode_features(features, lenient))
+                names.append(name)
+            except Exception as e:
+                errors.append({"name": name, "error": str(e)})
+        averages = category_averages(rows, slices)
+        scores = {variant: score_chunk(averages, weights) for variant, weights in variants.items()}
+        for index, name in enumerate(names):
+            yield {"name": name, "scores": {variant: scores[variant][index] for variant in variants}}
+        yield from errors
+
+class BatchWriter:
+    """Write batch results as JSONL, or as CSV when the path ends in .csv."""
+
+    def __init__(self, path, variants):
+        self.file = open(path, "w", newline="")
+        self.csv = None
+        if path.endswith(".csv"):
+            self.csv = csv.writer(self.file)
+            self.csv.writerow(["name"] + list(variants) + ["error"])
+        self.variants = list(variants)
+
+    def write(self, result):
+        if self.csv is None:
+            self.file.write(json.dumps(result) + "\n")
+        elif "error" in result:
+            self.csv.writerow([result["name"]] + [""] * len(self.variants) + [result["error"]])
+        else:
+            self.csv.writerow([result["name"]] + [result["scores"][variant] for variant in self.variants] + [""])
+
+    def close(self):
+        self.file.close()
+
+def leaderboard_path(output_file):
+    """Where the leaderboard goes by default: next to the results, e.g. scores.csv -> scores_leaderboard.json."""
+    return f"{os.path.splitext(output_file)[0]}_leaderboard.json"
+
+def run_batch(args):
+    """
+    Batch mode: score every input under every weight variant, then print the
+    top-N leaderboard per variant and save it as JSON.
+    """
+    variants = {}
+    if args.weights:
+        with open(args.weights, "r") as file:
+            variants = json.load(file)
+    variants = compile_weights(variants)
+
+    # Only the top entries per variant are kept, so memory stays flat.
+    leaders = {variant: [] for variant in variants}
+    scored = failed = 0
+    writer = BatchWriter(args.output_file, variants)
+    try:
+        for sequence, result in enumerate(score_batch(args.input_file, variants, args.lenient)):
+            writer.write(result)
+            if "error" in result:
+                failed += 1
+                continue
+            scored += 1
+            for variant, score in result["scores"].items():
+                entry = (score, -sequence, result["name"])
+                if len(leaders[variant]) < args.top:
+                    heapq.heappush(leaders[variant], entry)
+                else:
+                    heapq.heappushpop(leaders[variant], entry)
+    finally:
+        writer.close()
+
+    leaderboard = {}
+    for variant, entries in leaders.items():
+        leaderboard[variant] = [{"rank": rank, "name": name, "score": score}
+                                for rank, (score, _, name) in enumerate(sorted(entries, reverse=True), start=1)]
+        print(f"\nTop {len(entries)} under weights '{variant}':")
+        for entry in leaderboard[variant]:
+            print(f"{entry['rank']:>4}. {entry['name']}: {entry['score']}%")
+    leaderboard_file = args.leaderboard or leaderboard_path(args.output_file)
+    with open(leaderboard_file, "w") as file:
+        json.dump({"top": args.top, "scored": scored, "failed": failed, "variants": leaderboard}, file, indent=4)
+    print(f"\nScored {scored} inputs ({failed} failed) under {len(variants)} weight variants.")
+    print(f"Results saved to {args.output_file}, leaderboard to {leaderboard_file}")
+
 def main():
     parser = argparse.ArgumentParser(description="Calculate PostgreSQL Compatibility Index (PCI).")
-    parser.add_argument("input_file", help="Path to JSON file describing database features.")
-    parser.add_argument("output_file", help="Path to save the PCI score report.")
+    parser.add_argument("input_file", help="Path to JSON file describing database features (with --batch: a directory of JSON files or a JSONL file).")
+    parser.add_argument("output_file", help="Path to save the PCI score report (with --batch: a .jsonl or .csv file).")
+    parser.add_argument("--batch", action="store_true", help="Score many inputs in one pass.")
+    parser.add_argument("--weights", help="With --batch: JSON file of weight variants, {name: {category: weight}}, scored alongside the default weights.")
+    parser.add_argument("--top", type=int, default=10, help="With --batch: leaderboard entries kept per weight variant (default: 10).")
+    parser.add_argument("--leaderboard", help="With --batch: save the leaderboard as JSON to this file (default: <output>_leaderboard.json).")
+    parser.add_argument("--lenient", action="store_true", help="With --batch: score missing categories and sub-features as 'no', and 'timeout' as 0, instead of rejecting the input.")
     args = parser.parse_args()
 
+    if args.batch:
+        try:
+            run_batch(args)
+        except Exception as e:
+            print(f"Error: {e}")
+            sys.exit(1)
+        return
+
     try:
         # Load and validate input
         with open(args.input_file, "r") as file:
@@ -0,0 +1,107 @@
+import json
+import os
+import threading
+import time
+
+try:
+    import fcntl
+except ImportError:  # Not on Windows: the file is then never emptied
+    fcntl = None
+
+DEFAULT_CHECKPOINT_FILE = "pci_checkpoint.jsonl"
+
+
+class Checkpoint:
+    """
+    Probe outcomes streamed to a JSONL file as each one is produced: one line
+    per probe, tagged with the run, target and feature-set version, flushed
+    at once, so a run that dies keeps every probe it finished. Prints
+    progress as the lines go out. Runs sharing the file only ever append to
+    it; each holds a shared lock on it while open, and without resume the
+    file is emptied only if no other run holds it. Safe to share between threads.
+    """
+
+    def __init__(self, path=DEFAULT_CHECKPOINT_FILE, resume=False):
+        self.path = path
+        self.resume = resume
+        self.lock = threading.Lock()
+        self.run = None
+        self.target = None
+        self.feature_set = None
+        self.total = 0
+        self.done = 0
+        self.resumed = 0
+        self.started = None
+        self.file = open(path, "a")
+        if fcntl is not None:
+            try:
+                fcntl.flock(self.file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+                if not resume:
+                    self.file.truncate(0)
+                    self.file.seek(0, os.SEEK_END)
+            except BlockingIOError:
+                pass  # Another run is writing to it: keep its lines
+            fcntl.flock(self.file, fcntl.LOCK_SH)
+        # Finish a line left incomplete by a crash so the next one stands alone.
+        if self.file.tell() > 0:
+            with open(path, "rb") as existing:
+                existing.seek(-1, os.SEEK_END)
+                if existing.read(1) != b"\n":
+                    self.file.write("\n")
+
+    def read(self, target, feature_set):
+        """
+        {(category, feature): outcome} in the file for this target and feature
+        set, from any run; a later line for a probe replaces an earlier one. A
+        line cut short by a crash is skipped. Only used to resume.
+        """
+        outcomes = {}
+        try:
+            with open(self.path, "r") as file:
+                for line in file:
+                    try:
+                        entry = json.loads(line)
+                    except ValueError:
+                        continue
+                    if entry.get("target") != target or entry.get("feature_set") != feature_set:
+                        continue
+                    outcomes[(entry["category"], entry["feature"])] = {
+                        name: value for name, value in entry.items()
+                        if name not in ("run", "target", "feature_set", "category", "feature", "recorded_at")}
+        except FileNotFoundError:
+            pass
+        return outcomes
+
+    def start(self, run, target, feature_set, total, resumed=0):
+        """Begin streaming run `run` (its sandbox name) of `total` probes, `resumed` of them already done."""
+        self.run = run
+        self.target = target
+        self.feature_set = feature_set
+        self.total = total
+        self.done = self.resumed = resumed
+        self.started = time.monotonic()
+
+    def append(self, category, subfeature, outcome):
+        """Write one probe's outcome (verdict and timings) and report progress."""
+        entry = {"run": self.run, "target": self.target, "feature_set": self.feature_set, "category": category,
+                 "feature": subfeature}
+        entry.update(outcome)
+        entry["recorded_at"] = time.time()
+        with self.lock:
+            self.file.write(json.dumps(entry) + "\n")
+            self.file.flush()
+            self.done += 1
+            self.progress(category, subfeature, outcome)
+
+    def progress(self, category, subfeature, outcome):
+        elapsed = time.monotonic() - self.started
+        measured = self.done - self.resumed
+        remaining = elapsed / measured * (self.total - self.done) if measured else 0.0
+        print(f"[{self.done}/{self.total}] {category} / {subfeature}: {outcome['verdict']}"
+              f"{' (cached)' if outcome.get('cached') else ''} in {outcome['wall_ms']} ms; "
+              f"{elapsed:.1f}s elapsed, about {remaining:.0f}s left")
+
+    def close(self):
+        if self.file is not None:
+            self.file.close()
+            self.file = None
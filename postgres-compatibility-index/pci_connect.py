@@ -0,0 +1,236 @@
+import math
+import socket
+import ssl
+import struct
+import time
+
+import psycopg2
+from tabulate import tabulate
+
+DEFAULT_CONNECT_SAMPLES = 20  # Connections timed per run
+PERCENTILES = [50, 95, 99]
+POOLER_ROUNDS = 10  # Statements sent when checking whether session state survives between them
+SSL_REQUEST_CODE = 80877103  # Protocol code of the SSLRequest message
+SOCKET_TIMEOUT = 10  # Seconds before a raw TCP or TLS attempt is given up on
+
+
+def percentiles(values):
+    """Nearest-rank p50/p95/p99 of a list of milliseconds, or None if it is empty."""
+    if not values:
+        return None
+    ordered = sorted(values)
+    return {f"p{p}": round(ordered[max(0, math.ceil(p / 100 * len(ordered)) - 1)], 2) for p in PERCENTILES}
+
+
+def time_transport(params):
+    """
+    Time the TCP connect and the TLS handshake (SSLRequest included) on a raw
+    socket, the way libpq opens a connection. Returns (tcp_ms, tls_ms, error);
+    tls_ms is None when the server refuses TLS or sslmode is disable, and
+    both are None for Unix-domain socket targets. A phase that fails with
+    OSError (ssl.SSLError included) is None and error says why.
+    """
+    host = (params.get("host") or "").split(",")[0]
+    if not host or host.startswith("/"):
+        return None, None, None
+    port = int(str(params.get("port") or 5432).split(",")[0])
+    start = time.perf_counter()
+    try:
+        sock = socket.create_connection((host, port), timeout=SOCKET_TIMEOUT)
+    except OSError as e:
+        return None, None, f"TCP connect failed: {e}"
+    tcp_ms = (time.perf_counter() - start) * 1000
+    try:
+        if params.get("sslmode") == "disable":
+            return tcp_ms, None, None
+        start = time.perf_counter()
+        sock.sendall(struct.pack("!ii", 8, SSL_REQUEST_CODE))
+        if sock.recv(1) != b"S":
+            return tcp_ms, None, None
+        context = ssl.create_default_context()
+        context.check_hostname = False
+        context.verify_mode = ssl.CERT_NONE
+        sock = context.wrap_socket(sock, server_hostname=host)
+        return tcp_ms, (time.perf_counter() - start) * 1000, None
+    except OSError as e:
+        return tcp_ms, None, f"TLS handshake failed: {e}"
+    finally:
+        sock.close()
+
+
+def time_connection(connect):
+    """
+    Open a connection through connect() and time it and its first query;
+    returns (connection, connect_ms, first_query_ms). If the query fails,
+    the connection is closed and the error raised.
+    """
+    start = time.perf_counter()
+    connection = connect()
+    connect_ms = (time.perf_counter() - start) * 1000
+    try:
+        connection.autocommit = True
+        with connection.cursor() as cursor:
+            start = time.perf_counter()
+            cursor.execute("SELECT 1;")
+            first_query_ms = (time.perf_counter() - start) * 1000
+    except psycopg2.Error:
+        connection.close()
+        raise
+    return connection, connect_ms, first_query_ms
+
+
+def measure_setup(params, connect, samples):
+    """
+    Connect `samples` times. TCP and TLS are timed on a raw socket just
+    before each connection; libpq does not expose its own phase timings, so
+    auth (authentication and backend startup) is the full connect less both.
+    A sample whose raw TCP or TLS attempt fails keeps its connect and first
+    query timings but no auth; the failure is listed in transport_errors.
+    A sample whose connection or first query fails is left out of every
+    phase and listed in connect_errors.
+    """
+    phases = {"tcp_ms": [], "tls_ms": [], "auth_ms": [], "connect_ms": [], "first_query_ms": []}
+    tls = None
+    transport_errors = []
+    connect_errors = []
+    for sample in range(samples):
+        tcp_ms, tls_ms, error = time_transport(params)
+        if error is not None:
+            transport_errors.append({"sample": sample, "error": error})
+        try:
+            connection, connect_ms, first_query_ms = time_connection(connect)
+        except psycopg2.Error as e:
+            connect_errors.append({"sample": sample, "error": str(e).strip()})
+            continue
+        if tls is None:
+            tls = {"in_use": bool(connection.info.ssl_in_use), "protocol": connection.info.ssl_attribute("protocol"),
+                   "cipher": connection.info.ssl_attribute("cipher")}
+        connection.close()
+        if tcp_ms is not None:
+            phases["tcp_ms"].append(tcp_ms)
+        if tls_ms is not None:
+            phases["tls_ms"].append(tls_ms)
+        if tcp_ms is not None and error is None:
+            phases["auth_ms"].append(max(0.0, connect_ms - tcp_ms - (tls_ms or 0.0)))
+        phases["connect_ms"].append(connect_ms)
+        phases["first_query_ms"].append(first_query_ms)
+    return {phase: percentiles(values) for phase, values in phases.items()}, tls, transport_errors, connect_errors
+
+
+def measure_cold_start(connect, idle_periods):
+    """
+    For each idle period (seconds): leave the target alone for that long,
+    then time a fresh connection, its first query and a second, warm query.
+    Serverless targets that scale to zero pay their resume cost here; one
+    that fails to resume in time is recorded with its error.
+    """
+    results = []
+    for idle in idle_periods:
+        print(f"Idling {idle}s before a cold-start connection...")
+        time.sleep(idle)
+        try:
+            connection, connect_ms, first_query_ms = time_connection(connect)
+            try:
+                with connection.cursor() as cursor:
+                    start = time.perf_counter()
+                    cursor.execute("SELECT 1;")
+                    warm_query_ms = (time.perf_counter() - start) * 1000
+            finally:
+                connection.close()
+        except psycopg2.Error as e:
+            print(f"Cold-start connection after {idle}s failed: {e}")
+            results.append({"idle_s": idle, "error": str(e).strip()})
+            continue
+        results.append({"idle_s": idle, "connect_ms": round(connect_ms, 2), "first_query_ms": round(first_query_ms, 2),
+                        "warm_query_ms": round(warm_query_ms, 2)})
+    return results
+
+
+def survives(cursor, setup, check):
+    """
+    Run setup once, then check POOLER_ROUNDS times as separate autocommit
+    statements; "full" if every check passes. Behind a transaction-mode
+    pooler the checks can land on another server connection and fail.
+    """
+    try:
+        cursor.execute(setup)
+        for _ in range(POOLER_ROUNDS):
+            cursor.execute(check)
+            if cursor.description is not None:
+                cursor.fetchall()
+        return "full"
+    except psycopg2.Error as e:
+        print(f"Session state check failed ({setup.split()[0]}): {e}")
+        return "no"
+
+
+def check_pooler(connect):
+    """
+    Check what a connection pooler in front of the target keeps between
+    statements: the backend it talks to, prepared statements, SET values
+    and temporary tables. If no connection can be opened, or the backend
+    cannot be read, that is recorded as the error instead.
+    """
+    try:
+        connection = connect()
+    except psycopg2.Error as e:
+        print(f"Pooler check could not connect: {e}")
+        return {"error": str(e).strip()}
+    connection.autocommit = True
+    try:
+        with connection.cursor() as cursor:
+            backends = set()
+            try:
+                for _ in range(POOLER_ROUNDS):
+                    cursor.execute("SELECT pg_backend_pid();")
+                    backends.add(cursor.fetchone()[0])
+            except psycopg2.Error as e:
+                print(f"Pooler check could not read the backend: {e}")
+                return {"error": str(e).strip()}
+            setting = survives(cursor, "SET application_name = 'pci_pooler_check';",
+                               "DO $$ BEGIN IF current_setting('application_name') <> 'pci_pooler_check' THEN "
+                               "RAISE EXCEPTION 'application_name was reset'; END IF; END $$;")
+            return {
+                "backend_pid_stable": len(backends) == 1,
+                "prepared_statements": survives(cursor, "PREPARE pci_pooler_check AS SELECT 1;", "EXECUTE pci_pooler_check;"),
+                "session_settings": setting,
+                "temp_tables": survives(cursor, "CREATE TEMP TABLE pci_pooler_check (id INT);", "SELECT * FROM pci_pooler_check;"),
+            }
+    finally:
+        connection.close()
+
+
+def probe_connection(params, connect, samples=DEFAULT_CONNECT_SAMPLES, idle_periods=()):
+    """
+    Measure what connecting costs: connection setup by phase and first-query
+    latency over `samples` connections (p50/p95/p99), cold starts after each
+    of idle_periods, and pooler behaviour. connect() opens a connection to
+    the target described by params.
+    """
+    setup, tls, transport_errors, connect_errors = measure_setup(params, connect, samples)
+    return {"samples": samples, "setup": setup, "tls": tls, "transport_errors": transport_errors, "connect_errors": connect_errors,
+            "cold_start": measure_cold_start(connect, idle_periods),
+            "pooler": check_pooler(connect)}
+
+
+def print_connection(results):
+    """Print the connection measurements as tables."""
+    rows = [(phase[:-len("_ms")], *(values[f"p{p}"] for p in PERCENTILES)) if values else (phase[:-len("_ms")], "-", "-", "-")
+            for phase, values in results["setup"].items()]
+    print(f"\nConnection Setup over {results['samples']} connections (ms; auth = connect less TCP and TLS):\n")
+    print(tabulate(rows, headers=["Phase"] + [f"p{p}" for p in PERCENTILES], tablefmt="grid"))
+    tls = results["tls"]
+    print(f"TLS: {tls['protocol']} {tls['cipher']}" if tls and tls["in_use"] else "TLS: not in use")
+    if results["transport_errors"]:
+        print(f"Raw TCP/TLS timing failed on {len(results['transport_errors'])} of {results['samples']} connections, "
+              f"e.g. {results['transport_errors'][0]['error']}")
+    if results["connect_errors"]:
+        print(f"Connecting failed on {len(results['connect_errors'])} of {results['samples']} connections, "
+              f"e.g. {results['connect_errors'][0]['error']}")
+    if results["cold_start"]:
+        rows = [(run["idle_s"], run["error"], "", "") if "error" in run else
+                (run["idle_s"], run["connect_ms"], run["first_query_ms"], run["warm_query_ms"]) for run in results["cold_start"]]
+        print("\nCold Start after Idle (ms):\n")
+        print(tabulate(rows, headers=["Idle s", "Connect", "First Query", "Warm Query"], tablefmt="grid"))
+    print("\nSession State between Statements:\n")
+    print(tabulate(list(results["pooler"].items()), headers=["Check", "Result"], tablefmt="grid"))
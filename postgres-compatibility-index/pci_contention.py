@@ -0,0 +1,312 @@
+import random
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import psycopg2
+from psycopg2 import sql
+from tabulate import tabulate
+
+from pci_connect import PERCENTILES, percentiles
+
+DEFAULT_SESSIONS = 4  # Sessions driven at once by each workload
+DEFAULT_DURATION = 5  # Seconds the SERIALIZABLE and hot-row workloads run for
+COUNTERS = 4  # Rows the SERIALIZABLE workload's sessions update; fewer rows, more conflicts
+QUEUE_JOBS_PER_SESSION = 200  # Jobs queued per session for the SKIP LOCKED workload
+ABORT_RATE_LIMIT = 0.05  # Share of aborted transactions above which hot-row locking scores partial
+RETRYABLE = ("40001", "40P01")  # serialization_failure, deadlock_detected: the client is expected to retry
+SUPPORT_SCORES = {"full": 1.0, "partial": 0.5, "no": 0.0}
+
+
+def rollback(cursor):
+    try:
+        cursor.execute("ROLLBACK;")
+    except psycopg2.Error:
+        pass
+
+
+def run_sessions(connect, schema, sessions, probe_timeout, work):
+    """
+    Open `sessions` autocommit connections working in schema and run
+    work(cursor, number) on each in its own thread, all starting together.
+    Every statement is bounded by probe_timeout seconds (0 or None: no limit).
+    Returns the results of work() in session order.
+    """
+    connections = []
+    try:
+        for _ in range(sessions):
+            connection = connect()
+            connection.autocommit = True
+            connections.append(connection)
+            with connection.cursor() as cursor:
+                cursor.execute(sql.SQL("SET search_path TO {};").format(sql.Identifier(schema)))
+                if probe_timeout:
+                    cursor.execute("SELECT set_config('statement_timeout', %s, false);", (str(int(probe_timeout * 1000)),))
+        start = threading.Barrier(sessions)
+
+        def session(number):
+            with connections[number].cursor() as cursor:
+                start.wait()
+                return work(cursor, number)
+
+        with ThreadPoolExecutor(max_workers=sessions) as executor:
+            return list(executor.map(session, range(sessions)))
+    finally:
+        for connection in connections:
+            connection.close()
+
+
+def count_outcome(counts, error):
+    """Tally a failed transaction; returns False once it is not one the client should just retry."""
+    if error.pgcode in RETRYABLE:
+        counts["aborts"] += 1
+        return True
+    counts["error"] = str(error).strip()
+    return False
+
+
+def bench_serializable(cursor, connect, schema, sessions, duration, probe_timeout):
+    """
+    Sessions repeatedly read a random one of COUNTERS rows and write back
+    the value read plus one, under SERIALIZABLE. Conflicting transactions
+    must fail with a serialization failure; a commit that overwrote another
+    shows up as a lost update (final total below the commits).
+    """
+    cursor.execute(sql.SQL("""DROP TABLE IF EXISTS contention_counters;
+                              CREATE TABLE contention_counters (id INT PRIMARY KEY, value INT NOT NULL);
+                              INSERT INTO contention_counters SELECT g, 0 FROM generate_series(1, {}) g;""").format(sql.Literal(COUNTERS)))
+
+    def work(session_cursor, number):
+        rng = random.Random(number)
+        counts = {"attempts": 0, "commits": 0, "aborts": 0}
+        end = time.monotonic() + duration
+        while time.monotonic() < end:
+            counter = rng.randint(1, COUNTERS)
+            counts["attempts"] += 1
+            try:
+                session_cursor.execute("BEGIN ISOLATION LEVEL SERIALIZABLE;")
+                session_cursor.execute("SELECT value FROM contention_counters WHERE id = %s;", (counter,))
+                value = session_cursor.fetchone()[0]
+                session_cursor.execute("UPDATE contention_counters SET value = %s WHERE id = %s;", (value + 1, counter))
+                session_cursor.execute("COMMIT;")
+                counts["commits"] += 1
+            except psycopg2.Error as e:
+                rollback(session_cursor)
+                if not count_outcome(counts, e):
+                    break
+        return counts
+
+    counts = run_sessions(connect, schema, sessions, probe_timeout, work)
+    cursor.execute("SELECT sum(value) FROM contention_counters;")
+    total = int(cursor.fetchone()[0])
+    cursor.execute("DROP TABLE IF EXISTS contention_counters;")
+    attempts = sum(count["attempts"] for count in counts)
+    commits = sum(count["commits"] for count in counts)
+    aborts = sum(count["aborts"] for count in counts)
+    return {
+        "attempts": attempts,
+        "commits": commits,
+        "serialization_failures": aborts,
+        "failure_rate": round(aborts / attempts, 4) if attempts else None,
+        "commits_per_second": round(commits / duration, 1),
+        "lost_updates": commits - total,
+        "errors": [count["error"] for count in counts if "error" in count],
+    }
+
+
+def bench_hot_row(cursor, connect, schema, sessions, duration, probe_timeout):
+    """
+    Sessions repeatedly lock the same row with SELECT ... FOR UPDATE and
+    increment it. Measures how long each lock takes to get (one round trip
+    included), transactions per second and aborts; every commit must count.
+    """
+    cursor.execute("""DROP TABLE IF EXISTS contention_hot;
+                      CREATE TABLE contention_hot (id INT PRIMARY KEY, value INT NOT NULL);
+                      INSERT INTO contention_hot VALUES (1, 0);""")
+
+    def work(session_cursor, number):
+        counts = {"attempts": 0, "commits": 0, "aborts": 0, "lock_wait_ms": []}
+        end = time.monotonic() + duration
+        while time.monotonic() < end:
+            counts["attempts"] += 1
+            try:
+                session_cursor.execute("BEGIN;")
+                start = time.perf_counter()
+                session_cursor.execute("SELECT value FROM contention_hot WHERE id = 1 FOR UPDATE;")
+                counts["lock_wait_ms"].append((time.perf_counter() - start) * 1000)
+                value = session_cursor.fetchone()[0]
+                session_cursor.execute("UPDATE contention_hot SET value = %s WHERE id = 1;", (value + 1,))
+                session_cursor.execute("COMMIT;")
+                counts["commits"] += 1
+            except psycopg2.Error as e:
+                rollback(session_cursor)
+                if not count_outcome(counts, e):
+                    break
+        return counts
+
+    counts = run_sessions(connect, schema, sessions, probe_timeout, work)
+    cursor.execute("SELECT value FROM contention_hot WHERE id = 1;")
+    total = cursor.fetchone()[0]
+    cursor.execute("DROP TABLE IF EXISTS contention_hot;")
+    attempts = sum(count["attempts"] for count in counts)
+    commits = sum(count["commits"] for count in counts)
+    aborts = sum(count["aborts"] for count in counts)
+    return {
+        "attempts": attempts,
+        "commits": commits,
+        "aborts": aborts,
+        "abort_rate": round(aborts / attempts, 4) if attempts else None,
+        "commits_per_second": round(commits / duration, 1),
+        "lock_wait_ms": percentiles([wait for count in counts for wait in count["lock_wait_ms"]]),
+        "lost_updates": commits - total,
+        "errors": [count["error"] for count in counts if "error" in count],
+    }
+
+
+def bench_skip_locked(cursor, connect, schema, sessions, duration, probe_timeout):
+    """
+    Sessions drain a job queue, each claiming the next unlocked job with
+    FOR UPDATE SKIP LOCKED, one job per transaction, until the queue is
+    empty (or duration has passed). No job may be done twice; jobs still
+    queued at the end only mean the target is slower than duration allows.
+    """
+    jobs = sessions * QUEUE_JOBS_PER_SESSION
+    cursor.execute(sql.SQL("""DROP TABLE IF EXISTS contention_jobs;
+                              CREATE TABLE contention_jobs (id INT PRIMARY KEY, done_by INT, claims INT NOT NULL DEFAULT 0);
+                              INSERT INTO contention_jobs (id) SELECT generate_series(1, {});""").format(sql.Literal(jobs)))
+
+    def work(session_cursor, number):
+        counts = {"attempts": 0, "commits": 0, "aborts": 0}
+        start = time.perf_counter()
+        end = time.monotonic() + duration
+        while time.monotonic() < end:
+            counts["attempts"] += 1
+            try:
+                session_cursor.execute("BEGIN;")
+                session_cursor.execute("SELECT id FROM contention_jobs WHERE done_by IS NULL ORDER BY id LIMIT 1 FOR UPDATE SKIP LOCKED;")
+                job = session_cursor.fetchone()
+                if job is None:
+                    session_cursor.execute("COMMIT;")
+                    break
+                session_cursor.execute("UPDATE contention_jobs SET done_by = %s, claims = claims + 1 WHERE id = %s;", (number, job[0]))
+                session_cursor.execute("COMMIT;")
+                counts["commits"] += 1
+            except psycopg2.Error as e:
+                rollback(session_cursor)
+                if not count_outcome(counts, e):
+                    break
+        counts["seconds"] = time.perf_counter() - start
+        return counts
+
+    counts = run_sessions(connect, schema, sessions, probe_timeout, work)
+    cursor.execute("SELECT count(*) FILTER (WHERE done_by IS NULL), count(*) FILTER (WHERE claims > 1) FROM contention_jobs;")
+    remaining, duplicates = cursor.fetchone()
+    cursor.execute("DROP TABLE IF EXISTS contention_jobs;")
+    attempts = sum(count["attempts"] for count in counts)
+    done = sum(count["commits"] for count in counts)
+    aborts = sum(count["aborts"] for count in counts)
+    seconds = max(count["seconds"] for count in counts)
+    return {
+        "jobs": jobs,
+        "done": done,
+        "remaining": remaining,
+        "duplicates": duplicates,
+        "aborts": aborts,
+        "abort_rate": round(aborts / attempts, 4) if attempts else None,
+        "seconds": round(seconds, 3),
+        "jobs_per_second": round(done / seconds, 1) if seconds else None,
+        "per_session": [count["commits"] for count in counts],
+        "errors": [count["error"] for count in counts if "error" in count],
+    }
+
+
+# (name, workload, result key) in the order they run
+WORKLOADS = [
+    ("Serializable Contention", bench_serializable, "serializable"),
+    ("Hot Row Locking", bench_hot_row, "hot_row"),
+    ("SKIP LOCKED Queue", bench_skip_locked, "skip_locked_queue"),
+]
+
+
+def contention_verdicts(results):
+    """
+    A verdict per workload:
+    Serializable Contention - full when transactions commit and no update is
+    lost, partial when some commit but updates are lost or transactions fail
+    other than with a serialization failure;
+    Hot Row Locking - full when every commit counts and at most
+    ABORT_RATE_LIMIT of transactions abort, partial when some commit;
+    SKIP LOCKED Queue - full when no job is done twice and no transaction
+    fails other than to be retried, partial when some jobs are done. Jobs
+    left in the queue count against throughput, not the verdict, so a
+    high-latency target is not marked down for being slow.
+    A workload that errored, or where nothing committed, scores no.
+    """
+    verdicts = {}
+    serializable = results["serializable"]
+    if serializable.get("commits"):
+        verdicts["Serializable Contention"] = "full" if not serializable["lost_updates"] and not serializable["errors"] else "partial"
+    else:
+        verdicts["Serializable Contention"] = "no"
+
+    hot_row = results["hot_row"]
+    if hot_row.get("commits"):
+        verdicts["Hot Row Locking"] = "full" if not hot_row["lost_updates"] and not hot_row["errors"] \
+            and hot_row["abort_rate"] <= ABORT_RATE_LIMIT else "partial"
+    else:
+        verdicts["Hot Row Locking"] = "no"
+
+    queue = results["skip_locked_queue"]
+    if queue.get("done"):
+        verdicts["SKIP LOCKED Queue"] = "full" if not queue["duplicates"] and not queue["errors"] else "partial"
+    else:
+        verdicts["SKIP LOCKED Queue"] = "no"
+    return verdicts
+
+
+def run_contention(cursor, connect, schema, sessions=DEFAULT_SESSIONS, duration=DEFAULT_DURATION, probe_timeout=None):
+    """
+    Run every contention workload with `sessions` concurrent sessions. cursor
+    is an autocommit cursor whose search_path points at the scratch schema
+    `schema`; connect() opens the sessions' connections to the same database.
+    Returns the measurements, a verdict per workload and a 0-100 sub-score.
+    """
+    results = {"sessions": sessions, "duration_s": duration}
+    for name, workload, key in WORKLOADS:
+        try:
+            results[key] = workload(cursor, connect, schema, sessions, duration, probe_timeout)
+        except psycopg2.Error as e:
+            print(f"Contention workload {name} failed: {e}")
+            results[key] = {"error": str(e).strip()}
+    results["verdicts"] = contention_verdicts(results)
+    results["score"] = round(sum(SUPPORT_SCORES[verdict] for verdict in results["verdicts"].values()) / len(WORKLOADS) * 100, 2)
+    return results
+
+
+def describe(key, measured):
+    """One-line summary of a workload's measurements."""
+    if "error" in measured:
+        return measured["error"]
+    if key == "serializable":
+        text = (f"{measured['commits_per_second']} commits/s, {measured['serialization_failures']}/{measured['attempts']} "
+                f"serialization failures ({measured['failure_rate']:.1%}), {measured['lost_updates']} lost updates")
+    elif key == "hot_row":
+        waits = measured["lock_wait_ms"]
+        text = f"{measured['commits_per_second']} commits/s, {measured['aborts']} aborts, {measured['lost_updates']} lost updates"
+        if waits:
+            text += ", lock wait " + "/".join(str(waits[f"p{p}"]) for p in PERCENTILES) + " ms (" + \
+                    "/".join(f"p{p}" for p in PERCENTILES) + ")"
+    else:
+        text = (f"{measured['done']}/{measured['jobs']} jobs in {measured['seconds']} s ({measured['jobs_per_second']} jobs/s), "
+                f"{measured['duplicates']} done twice, {measured['aborts']} aborts")
+    if measured["errors"]:
+        text += f"; {measured['errors'][0]}"
+    return text
+
+
+def print_contention(results, transaction_verdicts):
+    """Print the contention verdicts and measurements below the transaction_features verdicts of the run."""
+    rows = [(feature, verdict, "single-session probe") for feature, verdict in transaction_verdicts.items()]
+    rows += [(name, results["verdicts"][name], describe(key, results[key])) for name, _, key in WORKLOADS]
+    print(f"\nTransaction Features under Contention ({results['sessions']} sessions, sub-score {results['score']}/100):\n")
+    print(tabulate(rows, headers=["Feature", "Result", "Measurement"], tablefmt="grid"))
@@ -0,0 +1,239 @@
+import argparse
+import random
+import sys
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import psycopg2
+
+from pci_autotest import DEFAULT_PROBE_TIMEOUT, ConnectionPool, calculate_pci, run_probes
+from pci_fleet import DEFAULT_CONNECT_TIMEOUT, load_inventory, with_connect_timeout
+
+DEFAULT_INTERVAL = 300  # Seconds between runs against a target
+DEFAULT_JITTER = 0.1  # Fraction of the interval each wait is randomly moved by
+DEFAULT_BACKOFF = 10  # Seconds before the first retry of a failed run; doubles with each failure
+DEFAULT_MAX_BACKOFF = 600  # Longest wait between retries
+DEFAULT_HOST = "127.0.0.1"
+DEFAULT_PORT = 9465
+
+LATENCY_BUCKETS = [0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120]  # Seconds
+VERDICTS = ["full", "partial", "no", "timeout"]
+
+
+def format_labels(labels):
+    escaped = (str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n") for value in labels.values())
+    return "{" + ",".join(f'{name}="{value}"' for name, value in zip(labels, escaped)) + "}"
+
+
+class Metrics:
+    """
+    What the daemon has seen so far, rendered in the Prometheus text format.
+    Scores and verdicts describe the latest successful run of each target;
+    latency histograms, run and connection error counts accumulate.
+    """
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.scores = {}  # target -> PCI score
+        self.verdicts = {}  # (target, category, feature) -> verdict
+        self.latency = {}  # (target, category, feature) -> [count per bucket..., sum, count]
+        self.runs = {}  # (target, result) -> runs
+        self.connection_errors = {}  # target -> connection errors
+        self.up = {}  # target -> 1 if the latest run succeeded
+        self.last_run = {}  # target -> (finished at, duration in seconds)
+
+    def record_run(self, target, pci_score, pci_results, timings, duration):
+        with self.lock:
+            self.scores[target] = pci_score
+            for category, subfeatures in pci_results.items():
+                for subfeature, verdict in subfeatures.items():
+                    self.verdicts[(target, category, subfeature)] = verdict
+                    timing = timings[category][subfeature]
+                    if not timing["cached"]:
+                        self.observe((target, category, subfeature), timing["wall_ms"] / 1000)
+            self.finish(target, "success", duration)
+
+    def record_connection_error(self, target):
+        """Count a connection lost during a run, or found dead in the pool, even though the run went on."""
+        with self.lock:
+            self.connection_errors[target] = self.connection_errors.get(target, 0) + 1
+
+    def record_failure(self, target, error, duration):
+        with self.lock:
+            if isinstance(error, psycopg2.OperationalError):
+                self.connection_errors[target] = self.connection_errors.get(target, 0) + 1
+            self.finish(target, "failure", duration)
+
+    def observe(self, key, seconds):
+        histogram = self.latency.setdefault(key, [0] * len(LATENCY_BUCKETS) + [0.0, 0])
+        for index, bound in enumerate(LATENCY_BUCKETS):
+            if seconds <= bound:
+                histogram[index] += 1
+        histogram[-2] += seconds
+        histogram[-1] += 1
+
+    def finish(self, target, result, duration):
+        self.runs[(target, result)] = self.runs.get((target, result), 0) + 1
+        self.connection_errors.setdefault(target, 0)
+        self.up[target] = 1 if result == "success" else 0
+        self.last_run[target] = (time.time(), duration)
+
+    def render(self):
+        lines = []
+
+        def family(name, kind, help_text, samples):
+            lines.append(f"# HELP {name} {help_text}")
+            lines.append(f"# TYPE {name} {kind}")
+            for suffix, labels, value in samples:
+                lines.append(f"{name}{suffix}{format_labels(labels)} {value}")
+
+        with self.lock:
+            family("pci_score", "gauge", "PCI score of the latest successful run.",
+                   [("", {"target": target}, score) for target, score in sorted(self.scores.items())])
+            family("pci_feature_verdict", "gauge", "1 for the verdict of each feature in the latest successful run, 0 for the others.",
+                   [("", {"target": target, "category": category, "feature": feature, "verdict": option}, int(verdict == option))
+                    for (target, category, feature), verdict in sorted(self.verdicts.items()) for option in VERDICTS])
+            samples = []
+            for (target, category, feature), histogram in sorted(self.latency.items()):
+                labels = {"target": target, "category": category, "feature": feature}
+                for bound, count in zip(LATENCY_BUCKETS, histogram):
+                    samples.append(("_bucket", dict(labels, le=bound), count))
+                samples.append(("_bucket", dict(labels, le="+Inf"), histogram[-1]))
+                samples.append(("_sum", labels, round(histogram[-2], 6)))
+                samples.append(("_count", labels, histogram[-1]))
+            family("pci_probe_duration_seconds", "histogram", "Wall time of each live (not cached) probe.", samples)
+            family("pci_runs_total", "counter", "Runs per target by result.",
+                   [("", {"target": target, "result": result}, count) for (target, result), count in sorted(self.runs.items())])
+            family("pci_connection_errors_total", "counter", "Connection errors: runs that failed on one, connections lost during a run and dead pooled connections.",
+                   [("", {"target": target}, count) for target, count in sorted(self.connection_errors.items())])
+            family("pci_up", "gauge", "1 if the latest run of the target succeeded.",
+                   [("", {"target": target}, up) for target, up in sorted(self.up.items())])
+            family("pci_last_run_timestamp_seconds", "gauge", "When the latest run of the target finished.",
+                   [("", {"target": target}, round(finished, 3)) for target, (finished, _) in sorted(self.last_run.items())])
+            family("pci_last_run_duration_seconds", "gauge", "How long the latest run of the target took.",
+                   [("", {"target": target}, round(duration, 3)) for target, (_, duration) in sorted(self.last_run.items())])
+        return "\n".join(lines) + "\n"
+
+
+class MetricsHandler(BaseHTTPRequestHandler):
+    """Serve Metrics.render() on /metrics."""
+
+    def do_GET(self):
+        if self.path.split("?")[0] != "/metrics":
+            self.send_error(404)
+            return
+        body = self.server.metrics.render().encode()
+        self.send_response(200)
+        self.send_header("Content-Type", "text/plain; version=0.0.4; charset=utf-8")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+
+def next_delay(interval, jitter, failures, backoff, max_backoff):
+    """
+    Seconds until a target's next run: the interval, or after consecutive
+    failures an exponential backoff capped at max_backoff. Either is moved by
+    up to +/- jitter of itself so targets do not stay in lockstep.
+    """
+    delay = interval if failures == 0 else min(max_backoff, backoff * 2 ** (failures - 1))
+    return max(0.0, delay * (1 + random.uniform(-jitter, jitter)))
+
+
+def watch_target(target, dsn, args, metrics, pool, stop):
+    """Score one target over and over until stopped (or for --cycles runs)."""
+    failures = 0
+    cycle = 0
+    while not stop.is_set():
+        start = time.monotonic()
+        try:
+            pci_results, timings = run_probes(args.workers, dsn, args.probe_timeout, args.run_timeout,
+                                              pipeline=args.pipeline, pool=pool)
+            pci_score, _ = calculate_pci(pci_results)
+            metrics.record_run(target, pci_score, pci_results, timings, time.monotonic() - start)
+            failures = 0
+            print(f"{target}: PCI Score {pci_score}%")
+        except Exception as e:
+            failures += 1
+            metrics.record_failure(target, e, time.monotonic() - start)
+            print(f"{target}: run failed ({failures} in a row): {e}")
+        cycle += 1
+        if args.cycles and cycle >= args.cycles:
+            break
+        stop.wait(next_delay(args.interval, args.jitter, failures, args.backoff, args.max_backoff))
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Re-score PostgreSQL-compatible targets on a schedule and export Prometheus metrics.")
+    parser.add_argument("inventory", nargs="?", help="JSON file mapping target names to DSNs, as for pci_fleet.py "
+                                                     "(default: the single PG_* target, named 'default').")
+    parser.add_argument("--interval", type=float, default=DEFAULT_INTERVAL, help=f"Seconds between runs (default: {DEFAULT_INTERVAL}).")
+    parser.add_argument("--jitter", type=float, default=DEFAULT_JITTER,
+                        help=f"Fraction each wait is randomly moved by (default: {DEFAULT_JITTER}).")
+    parser.add_argument("--backoff", type=float, default=DEFAULT_BACKOFF,
+                        help=f"Seconds before retrying a failed run, doubled per consecutive failure (default: {DEFAULT_BACKOFF}).")
+    parser.add_argument("--max-backoff", type=float, default=DEFAULT_MAX_BACKOFF,
+                        help=f"Longest wait between retries (default: {DEFAULT_MAX_BACKOFF}).")
+    parser.add_argument("--cycles", type=int, default=0, help="Stop after this many runs per target (default: 0, run until interrupted).")
+    parser.add_argument("--host", default=DEFAULT_HOST, help=f"Address the metrics endpoint listens on (default: {DEFAULT_HOST}).")
+    parser.add_argument("--port", type=int, default=DEFAULT_PORT, help=f"Port of the metrics endpoint (default: {DEFAULT_PORT}).")
+    parser.add_argument("--workers", type=int, default=1, help="Connections per target, as in pci_autotest.py --workers.")
+    parser.add_argument("--pipeline", action="store_true", help="Pipeline probes, as in pci_autotest.py --pipeline.")
+    parser.add_argument("--connect-timeout", type=int, default=DEFAULT_CONNECT_TIMEOUT,
+                        help="Seconds to wait for a target to accept a connection.")
+    parser.add_argument("--probe-timeout", type=float, default=DEFAULT_PROBE_TIMEOUT,
+                        help=f"Seconds before a probe is cancelled and scored 'timeout' (default: {DEFAULT_PROBE_TIMEOUT}).")
+    parser.add_argument("--run-timeout", type=float, default=0, help="Seconds each run may take (default: 0, no limit).")
+    args = parser.parse_args(argv)
+    if args.interval <= 0 or args.backoff <= 0 or args.max_backoff <= 0:
+        parser.error("--interval, --backoff and --max-backoff must be positive")
+    if not 0 <= args.jitter < 1:
+        parser.error("--jitter must be at least 0 and below 1")
+    if args.workers < 1 or args.cycles < 0:
+        parser.error("--workers must be at least 1 and --cycles cannot be negative")
+
+    if args.inventory:
+        try:
+            inventory = {target: with_connect_timeout(dsn, args.connect_timeout)
+                         for target, dsn in load_inventory(args.inventory).items()}
+        except Exception as e:
+            print(f"Error: {e}")
+            sys.exit(1)
+    else:
+        inventory = {"default": None}
+
+    metrics = Metrics()
+    server = ThreadingHTTPServer((args.host, args.port), MetricsHandler)
+    server.metrics = metrics
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    print(f"Serving metrics on http://{args.host}:{server.server_port}/metrics")
+
+    # Connections stay open between runs instead of being made afresh each time,
+    # in a pool per target so that the connections it loses are counted against it.
+    pools = {target: ConnectionPool(on_lost=lambda target=target: metrics.record_connection_error(target)) for target in inventory}
+    stop = threading.Event()
+    watchers = [threading.Thread(target=watch_target, args=(target, dsn, args, metrics, pools[target], stop), daemon=True)
+                for target, dsn in inventory.items()]
+    for watcher in watchers:
+        watcher.start()
+    try:
+        for watcher in watchers:
+            while watcher.is_alive():
+                watcher.join(1)
+    except KeyboardInterrupt:
+        print("Stopping after the current runs.")
+        stop.set()
+        for watcher in watchers:
+            watcher.join()
+    finally:
+        server.shutdown()
+        for pool in pools.values():
+            pool.close()
+
+
+if __name__ == "__main__":
+    main()
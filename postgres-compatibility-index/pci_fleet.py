@@ -0,0 +1,139 @@
+import argparse
+import json
+import os
+import re
+import sys
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
+import psycopg2
+from tabulate import tabulate
+
+from pci_autotest import DEFAULT_PROBE_TIMEOUT, calculate_pci, feature_set_version, run_probes, write_report
+from pci_cache import DEFAULT_CACHE_FILE, ResultCache
+from pci_store import ResultStore
+
+DEFAULT_CONNECT_TIMEOUT = 10  # Seconds before an unreachable target is given up on
+
+
+def load_inventory(path):
+    """
+    Load the fleet inventory: a JSON object mapping target name to DSN, e.g.
+    {"Neon": "postgresql://user@ep-example.neon.tech/testdb", ...}.
+    Passwords can be left out of the DSN and supplied through ~/.pgpass.
+    """
+    with open(path, "r") as file:
+        inventory = json.load(file)
+    if not isinstance(inventory, dict) or not inventory:
+        raise ValueError("Inventory must be a non-empty JSON object of target name to DSN.")
+    for target, dsn in inventory.items():
+        if not isinstance(dsn, str):
+            raise ValueError(f"DSN for target '{target}' must be a string.")
+    return inventory
+
+
+def report_filename(target):
+    """Turn a target name into a file name for outputs/, e.g. 'EDB Postgres' -> 'EDBPostgres.json'."""
+    return re.sub(r"[^A-Za-z0-9()._-]", "", target) + ".json"
+
+
+def with_connect_timeout(dsn, timeout):
+    """Add connect_timeout to a DSN unless it already sets one."""
+    params = psycopg2.extensions.parse_dsn(dsn)
+    params.setdefault("connect_timeout", str(timeout))
+    return psycopg2.extensions.make_dsn(**params)
+
+
+def score_target(target, dsn, output_dir, workers, probe_timeout, run_timeout, cache, store=None):
+    """Score one target and write its report (and record it in a ResultStore); returns a ranking entry."""
+    pci_results, timings = run_probes(workers, dsn, probe_timeout, run_timeout, cache)
+    pci_score, failed_tests = calculate_pci(pci_results)
+    report_path = os.path.join(output_dir, report_filename(target))
+    write_report(report_path, pci_score, pci_results, timings)
+    if store is not None:
+        store.record(target, pci_score, pci_results, timings, feature_set_version(), source=report_path)
+    return {"target": target, "pci_score": pci_score, "failed": len(failed_tests), "report": report_path}
+
+
+def run_fleet(inventory, output_dir, parallel, workers, connect_timeout, probe_timeout, run_timeout, cache=None, store=None):
+    """
+    Score every target in the inventory, at most `parallel` at a time.
+    A target that fails (unreachable, dropped connection, ...) is recorded
+    with its error and does not hold up the rest of the fleet; run_timeout
+    bounds how long a slow target can keep its slot.
+    """
+    ranking = []
+    with ThreadPoolExecutor(max_workers=parallel) as executor:
+        futures = {
+            executor.submit(score_target, target, with_connect_timeout(dsn, connect_timeout), output_dir, workers,
+                            probe_timeout, run_timeout, cache, store): target
+            for target, dsn in inventory.items()
+        }
+        for future in as_completed(futures):
+            target = futures[future]
+            try:
+                entry = future.result()
+                print(f"{target}: PCI Score {entry['pci_score']}%")
+            except Exception as e:
+                print(f"{target}: scoring failed: {e}")
+                entry = {"target": target, "pci_score": None, "failed": None, "report": None, "error": str(e)}
+            ranking.append(entry)
+
+    # Highest score first; targets that could not be scored go last.
+    ranking.sort(key=lambda entry: (entry["pci_score"] is None, -(entry["pci_score"] or 0), entry["target"]))
+    return ranking
+
+
+def print_ranking(ranking):
+    """Print the combined fleet ranking."""
+    print("\n==================== PCI FLEET RANKING =====================")
+    rows = [
+        (position, entry["target"], "error" if entry["pci_score"] is None else f"{entry['pci_score']}%",
+         entry["error"].splitlines()[0] if "error" in entry else entry["failed"])
+        for position, entry in enumerate(ranking, start=1)
+    ]
+    print(tabulate(rows, headers=["Rank", "Target", "PCI Score", "Failed Features"], tablefmt="grid"))
+    print("==========================================================\n")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Score a fleet of PostgreSQL-compatible targets concurrently.")
+    parser.add_argument("inventory", help="Path to JSON file mapping target names to DSNs.")
+    parser.add_argument("--output-dir", default="outputs", help="Directory for the per-target reports (default: outputs).")
+    parser.add_argument("--ranking", default="pci_fleet_ranking.json", help="Path to save the combined ranking.")
+    parser.add_argument("--parallel", type=int, default=4, help="Number of targets scored at the same time (default: 4).")
+    parser.add_argument("--workers", type=int, default=1, help="Connections per target, as in pci_autotest.py --workers.")
+    parser.add_argument("--connect-timeout", type=int, default=DEFAULT_CONNECT_TIMEOUT,
+                        help="Seconds to wait for a target to accept a connection.")
+    parser.add_argument("--probe-timeout", type=float, default=DEFAULT_PROBE_TIMEOUT,
+                        help=f"Seconds before a probe is cancelled and scored 'timeout' (default: {DEFAULT_PROBE_TIMEOUT}).")
+    parser.add_argument("--run-timeout", type=float, default=0,
+                        help="Seconds each target's run may take (default: 0, no limit).")
+    parser.add_argument("--no-cache", action="store_true", help="Run every probe live on every target.")
+    parser.add_argument("--cache-file", default=DEFAULT_CACHE_FILE, help=f"Result cache location (default: {DEFAULT_CACHE_FILE}).")
+    parser.add_argument("--store", help="Also append every scored target to this results store (see pci_store.py).")
+    args = parser.parse_args()
+    if args.parallel < 1 or args.workers < 1:
+        parser.error("--parallel and --workers must be at least 1")
+
+    try:
+        inventory = load_inventory(args.inventory)
+    except Exception as e:
+        print(f"Error: {e}")
+        sys.exit(1)
+
+    os.makedirs(args.output_dir, exist_ok=True)
+    cache = None if args.no_cache else ResultCache(args.cache_file)
+    store = ResultStore(args.store) if args.store else None
+    ranking = run_fleet(inventory, args.output_dir, args.parallel, args.workers, args.connect_timeout,
+                        args.probe_timeout, args.run_timeout, cache, store)
+    if store is not None:
+        store.close()
+    print_ranking(ranking)
+
+    with open(args.ranking, "w") as file:
+        json.dump(ranking, file, indent=4)
+    print(f"Fleet ranking saved to {args.ranking}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,234 @@
+import argparse
+import contextlib
+import decimal
+import json
+import os
+import sys
+import time
+
+import psycopg2
+from psycopg2 import errors
+from tabulate import tabulate
+
+from pci_autotest import ProbeTimeout, calculate_pci, feature_set_version, list_probes, print_summary, test_feature, timed_out_tests
+from pci_connect import PERCENTILES, percentiles
+
+DEFAULT_ROUNDS = 200  # Times each probe is replayed by --benchmark
+
+
+class ReplayMismatch(Exception):
+    """Raised when a probe sends a statement the cassette does not have at that point."""
+
+
+def decode_value(value):
+    """json object_hook undoing pci_autotest.encode_value()."""
+    if list(value) == ["__decimal__"]:
+        return decimal.Decimal(value["__decimal__"])
+    return value
+
+
+def load_cassette(path):
+    """Read a cassette written by pci_autotest.py --record, with result rows as tuples like psycopg2 returns them."""
+    with open(path, "r") as cassette_file:
+        cassette = json.load(cassette_file, object_hook=decode_value)
+    for subfeatures in cassette["probes"].values():
+        for recorded in subfeatures.values():
+            for entry in recorded["statements"]:
+                if "rows" in entry:
+                    entry["rows"] = [tuple(row) for row in entry["rows"]]
+    return cassette
+
+
+def replay_error(entry):
+    """
+    Rebuild the exception a recorded statement raised: the psycopg2.errors
+    class of its SQLSTATE (SyntaxError, UndefinedFunction,
+    FeatureNotSupported...), or the class it was recorded under.
+    """
+    if entry["error"] == "ProbeTimeout":
+        return ProbeTimeout(entry["message"])
+    error_class = getattr(psycopg2, entry["error"], psycopg2.Error)
+    if entry.get("pgcode"):
+        try:
+            error_class = errors.lookup(entry["pgcode"])
+        except KeyError:
+            pass
+    return error_class(entry["message"])
+
+
+class ReplayCursor:
+    """
+    Stands in for a ProbeCursor with no server behind it. Each execute() is
+    answered from the probe's next recorded statement: the recorded error
+    is raised or the recorded rows are served. A statement that is not the
+    one recorded at that point raises ReplayMismatch and is kept in mismatch.
+    """
+
+    def __init__(self, statements, snapshot=None, round_trip_ms=0.0, sandbox=None):
+        self.statements = statements
+        self.snapshot = snapshot
+        self.sandbox = sandbox
+        self.round_trip_ms = round_trip_ms
+        self.position = 0
+        self.rows = []
+        self.round_trips = 0
+        self.execute_ms = 0.0
+        self.deadline = None
+        self.timed_out = False
+        self.mismatch = None
+
+    def execute(self, query, vars=None):
+        if self.position >= len(self.statements) or self.statements[self.position]["query"] != query or vars is not None:
+            self.mismatch = query
+            raise ReplayMismatch(f"statement {self.position + 1} was not recorded: {query}")
+        entry = self.statements[self.position]
+        self.position += 1
+        self.round_trips += 1
+        if "error" in entry:
+            error = replay_error(entry)
+            if isinstance(error, (ProbeTimeout, errors.QueryCanceled)):
+                self.timed_out = True
+            raise error
+        self.rows = list(entry.get("rows", ()))
+
+    def fetchone(self):
+        return self.rows.pop(0) if self.rows else None
+
+    def fetchall(self):
+        rows, self.rows = self.rows, []
+        return rows
+
+
+def replay_probe(cassette, category, subfeature):
+    """
+    Score one probe from the cassette. Returns (verdict, problem); problem
+    is None when the probe sent exactly the recorded statements.
+    """
+    recorded = cassette["probes"].get(category, {}).get(subfeature)
+    if recorded is None:
+        return "no", "not in the cassette"
+    if recorded["skipped"]:
+        return "timeout", None
+    cursor = ReplayCursor(recorded["statements"], cassette["snapshot"], cassette["round_trip_ms"], cassette.get("sandbox"))
+    verdict = test_feature(cursor, category, subfeature)
+    if cursor.timed_out:
+        verdict = "timeout"
+    if cursor.mismatch is not None:
+        return verdict, f"sent an unrecorded statement: {cursor.mismatch}"
+    if cursor.position < len(recorded["statements"]):
+        return verdict, f"sent {cursor.position} of {len(recorded['statements'])} recorded statements"
+    return verdict, None
+
+
+def replay(cassette):
+    """
+    Replay every probe. Returns the verdicts in the pci_autotest layout and
+    [(category, feature, problem)] for probes that did not replay as
+    recorded, including those whose verdict is no longer the recorded one.
+    """
+    pci_results = {}
+    problems = []
+    for category, subfeature in list_probes():
+        verdict, problem = replay_probe(cassette, category, subfeature)
+        recorded = cassette["probes"].get(category, {}).get(subfeature)
+        if problem is None and verdict != recorded["verdict"]:
+            problem = f"scored '{verdict}', recorded '{recorded['verdict']}'"
+        if problem is not None:
+            problems.append((category, subfeature, problem))
+        pci_results.setdefault(category, {})[subfeature] = verdict
+    return pci_results, problems
+
+
+def time_rounds(rounds, function, *args):
+    """Microseconds per call of function(*args) over `rounds` calls, as percentiles()."""
+    samples = []
+    for _ in range(rounds):
+        start = time.perf_counter()
+        function(*args)
+        samples.append((time.perf_counter() - start) * 1e6)
+    return percentiles(samples)
+
+
+def score_and_summarize(cassette):
+    pci_results, _ = replay(cassette)
+    pci_score, failed_tests = calculate_pci(pci_results)
+    print_summary(pci_score, failed_tests, timed_out=timed_out_tests(pci_results))
+
+
+def benchmark_replay(cassette, rounds=DEFAULT_ROUNDS):
+    """
+    Time the harness with the server taken out: each probe replayed `rounds`
+    times through test_feature(), then calculate_pci() and print_summary()
+    on the replayed verdicts, then the whole pipeline end to end. Output is
+    discarded. All figures are microseconds per call.
+    """
+    pci_results, _ = replay(cassette)
+    pci_score, failed_tests = calculate_pci(pci_results)
+    timed_out = timed_out_tests(pci_results)
+    probes = []
+    with open(os.devnull, "w") as sink, contextlib.redirect_stdout(sink):
+        for category, subfeature in list_probes():
+            recorded = cassette["probes"].get(category, {}).get(subfeature)
+            probes.append({"category": category, "feature": subfeature,
+                           "statements": len(recorded["statements"]) if recorded else 0,
+                           "us": time_rounds(rounds, replay_probe, cassette, category, subfeature)})
+        scoring = {"calculate_pci": time_rounds(rounds, calculate_pci, pci_results),
+                   "print_summary": time_rounds(rounds, print_summary, pci_score, failed_tests, None, timed_out),
+                   "full run": time_rounds(rounds, score_and_summarize, cassette)}
+    return {"rounds": rounds, "probes": probes, "scoring": scoring}
+
+
+def print_replay_benchmark(results):
+    """Print the replay benchmark, most expensive probe first."""
+    headers = [f"p{p} us" for p in PERCENTILES]
+    rows = [(probe["category"], probe["feature"], probe["statements"], *(probe["us"][f"p{p}"] for p in PERCENTILES),
+             round(probe["us"]["p50"] / probe["statements"], 2) if probe["statements"] else "-")
+            for probe in sorted(results["probes"], key=lambda probe: probe["us"]["p50"], reverse=True)]
+    print(f"\nHarness Overhead per Probe under Replay ({results['rounds']} rounds):\n")
+    print(tabulate(rows, headers=["Category", "Feature", "Statements"] + headers + ["p50 us/statement"], tablefmt="grid"))
+    rows = [(step, *(values[f"p{p}"] for p in PERCENTILES)) for step, values in results["scoring"].items()]
+    print("\nScoring and Reporting:\n")
+    print(tabulate(rows, headers=["Step"] + headers, tablefmt="grid"))
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Replay a run recorded with pci_autotest.py --record, with no database.")
+    parser.add_argument("cassette", help="Cassette file written by pci_autotest.py --record.")
+    parser.add_argument("--benchmark", action="store_true", help="Also time the harness overhead of each probe under replay.")
+    parser.add_argument("--rounds", type=int, default=DEFAULT_ROUNDS,
+                        help=f"Replays of each probe timed by --benchmark (default: {DEFAULT_ROUNDS}).")
+    parser.add_argument("--output", help="Save the benchmark results as JSON to this file.")
+    args = parser.parse_args(argv)
+    if args.rounds < 1:
+        parser.error("--rounds must be at least 1")
+
+    try:
+        cassette = load_cassette(args.cassette)
+    except (OSError, ValueError, KeyError) as e:
+        print(f"Error: cannot read cassette {args.cassette}: {e}")
+        sys.exit(1)
+    if cassette["feature_set"] != feature_set_version():
+        print(f"Cassette was recorded with probe code {cassette['feature_set']}, this is {feature_set_version()}; "
+              "probes changed since then may not replay.")
+
+    pci_results, problems = replay(cassette)
+    print(pci_results)
+    pci_score, failed_tests = calculate_pci(pci_results)
+    print_summary(pci_score, failed_tests, timed_out=timed_out_tests(pci_results))
+    if problems:
+        print("Probes that did not replay as recorded:\n")
+        print(tabulate(problems, headers=["Category", "Feature", "Problem"], tablefmt="grid"))
+
+    if args.benchmark:
+        results = benchmark_replay(cassette, args.rounds)
+        print_replay_benchmark(results)
+        if args.output:
+            with open(args.output, "w") as output_file:
+                json.dump(results, output_file, indent=4)
+            print(f"Benchmark saved to {args.output}.")
+    if problems:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
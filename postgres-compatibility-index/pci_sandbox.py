@@ -0,0 +1,207 @@
+import re
+import secrets
+import time
+
+import psycopg2
+from psycopg2 import sql
+
+SANDBOX_MODES = ["schema", "database"]
+DEFAULT_TEMPLATE = "template1"
+SANDBOX_PREFIX = "pci_run_"
+# Every object a sandbox creates starts with its name: the prefix, the creation
+# time in hex seconds, then random hex.
+SANDBOX_NAME = r"^pci_run_([0-9a-f]{8})[0-9a-f]{6}"
+LEGACY_SCHEMAS = r"^pci_test(_w[0-9]+)?$"  # Fixed-name scratch schemas used before sandboxes
+STALE_AFTER_HOURS = 24  # Sandboxes older than this are taken to be left by a run that died
+
+EXTENSION_SCHEMA = "pci_extensions"  # Schema the probes create extensions in, shared by every run
+
+# Candidates for sweep(), which keeps those whose name says they are stale.
+# Besides its schemas or database, a run names the publication and role the
+# probes create after its sandbox (see pci_autotest.global_name()).
+SWEEP_QUERY = """
+SELECT 'schema', nspname::text FROM pg_namespace WHERE nspname LIKE 'pci\\_run\\_%' OR nspname LIKE 'pci\\_test%'
+UNION ALL
+SELECT 'database', datname::text FROM pg_database WHERE datname LIKE 'pci\\_run\\_%'
+UNION ALL
+SELECT 'publication', pubname::text FROM pg_publication WHERE pubname LIKE 'pci\\_run\\_%'
+UNION ALL
+SELECT 'role', rolname::text FROM pg_roles WHERE rolname LIKE 'pci\\_run\\_%';
+"""
+
+# What one run created under its own name.
+RUN_OBJECTS_QUERY = """
+SELECT 'schema', nspname::text FROM pg_namespace WHERE nspname = %(name)s OR nspname LIKE %(prefix)s
+UNION ALL
+SELECT 'publication', pubname::text FROM pg_publication WHERE pubname LIKE %(prefix)s
+UNION ALL
+SELECT 'role', rolname::text FROM pg_roles WHERE rolname LIKE %(prefix)s;
+"""
+
+# Whether another run's sandbox exists (it may be using the shared
+# extensions), whether EXTENSION_SCHEMA exists, and the extensions in it.
+SHARED_EXTENSIONS_QUERY = """
+SELECT EXISTS (SELECT 1 FROM pg_namespace WHERE nspname LIKE 'pci\\_run\\_%%' AND nspname NOT LIKE %(own)s)
+       OR EXISTS (SELECT 1 FROM pg_database WHERE datname LIKE 'pci\\_run\\_%%' AND datname NOT LIKE %(own)s),
+       EXISTS (SELECT 1 FROM pg_namespace WHERE nspname = %(schema)s),
+       ARRAY(SELECT e.extname::text FROM pg_extension e JOIN pg_namespace n ON n.oid = e.extnamespace WHERE n.nspname = %(schema)s);
+"""
+
+
+def sandbox_name(schema):
+    """The name of the sandbox a schema (<name>, <name>_wN, <name>_bench...) belongs to, or None."""
+    match = re.match(SANDBOX_NAME, schema)
+    return match.group(0) if match else None
+
+
+def is_stale(name, now):
+    """Whether an object is a sandbox's (or part of one) created over STALE_AFTER_HOURS ago, or a legacy schema."""
+    match = re.match(SANDBOX_NAME, name)
+    if match:
+        return now - int(match.group(1), 16) > STALE_AFTER_HOURS * 3600
+    return re.match(LEGACY_SCHEMAS, name) is not None
+
+
+class Sandbox:
+    """
+    A uniquely named place for one run to create its objects in, so that
+    concurrent runs do not collide and a run leaves nothing behind.
+
+    In "schema" mode the run uses a pci_run_<id> schema (plus <name>_wN
+    worker and <name>_bench schemas) in the target database. In "database"
+    mode it uses a pci_run_<id> database cloned from `template`, which can be
+    a pre-warmed template with the extensions the target is expected to
+    provide. If the target does not allow CREATE DATABASE, the sandbox falls
+    back to schema mode.
+
+    Objects the probes need outside it (a publication, a role) are named
+    after the sandbox, and extensions go in the shared EXTENSION_SCHEMA,
+    so concurrent runs do not collide. The name carries its creation time:
+    sweep() only drops sandboxes older than STALE_AFTER_HOURS, since whether
+    a run is still connected cannot be told reliably behind a pooler or on
+    a multi-node target. The control connection stays open for the whole
+    run under the sandbox's name (application_name); at teardown it is
+    passed to release, or closed.
+    """
+
+    def __init__(self, connection, params, mode="schema", template=DEFAULT_TEMPLATE, release=None):
+        start = time.perf_counter()
+        self.connection = connection
+        self.release = release
+        self.connection.autocommit = True
+        self.cursor = connection.cursor()
+        self.mode = mode
+        self.name = f"{SANDBOX_PREFIX}{int(time.time()):08x}{secrets.token_hex(3)}"
+        self.schema = self.name
+        self.database = None
+        self.cursor.execute("SELECT set_config('application_name', %s, false), current_setting('server_version_num')::int;",
+                            (self.name,))
+        self.server_version_num = self.cursor.fetchone()[1]
+        self.swept = self.sweep()
+        self.dropped = []
+        if mode == "database":
+            self.create_database(template)
+        self.dsn = psycopg2.extensions.make_dsn(**dict(params, **({"dbname": self.database} if self.database else {})))
+        self.setup_ms = round((time.perf_counter() - start) * 1000, 2)
+        self.teardown_ms = None
+
+    def create_database(self, template):
+        try:
+            self.cursor.execute(sql.SQL("CREATE DATABASE {} TEMPLATE {};").format(sql.Identifier(self.name), sql.Identifier(template)))
+            self.database = self.name
+        except psycopg2.Error as e:
+            print(f"Cannot create a sandbox database, using a sandbox schema instead: {e}")
+            self.mode = "schema"
+
+    def sweep(self):
+        """
+        Drop sandboxes older than STALE_AFTER_HOURS, left behind by runs that
+        died before teardown, and the fixed-name schemas of older versions.
+        One query when there is nothing to drop, so back-to-back runs start
+        in constant time. A target that cannot answer it is not swept.
+        """
+        try:
+            self.cursor.execute(SWEEP_QUERY)
+            candidates = self.cursor.fetchall()
+        except psycopg2.Error as e:
+            print(f"Cannot look for stale sandboxes, not sweeping: {e}")
+            return []
+        now = time.time()
+        swept = []
+        for kind, name in candidates:
+            if is_stale(name, now) and self.drop(kind, name):
+                swept.append(f"{kind} {name}")
+        return swept
+
+    def drop(self, kind, name):
+        if kind == "database":
+            statement = sql.SQL("DROP DATABASE IF EXISTS {}{};").format(
+                sql.Identifier(name), sql.SQL(" WITH (FORCE)" if self.server_version_num >= 130000 else ""))
+        elif kind == "schema":
+            statement = sql.SQL("DROP SCHEMA IF EXISTS {} CASCADE;").format(sql.Identifier(name))
+        else:
+            statement = sql.SQL("DROP {} IF EXISTS {};").format(sql.SQL(kind.upper()), sql.Identifier(name))
+        return self.execute(statement, f"{kind} {name}")
+
+    def execute(self, statement, description):
+        try:
+            self.cursor.execute(statement)
+            return True
+        except psycopg2.Error as e:
+            print(f"Could not drop {description}: {e}")
+            return False
+
+    def teardown(self):
+        """
+        Drop the sandbox and everything named after it, then close or release
+        the control connection. Extensions in the shared schema are dropped
+        too, with the schema, unless another run's sandbox exists. Returns
+        report(). Safe to call twice.
+        """
+        if self.teardown_ms is not None or self.connection.closed:
+            return self.report()
+        start = time.perf_counter()
+        try:
+            if self.database:
+                if self.drop("database", self.database):
+                    self.dropped.append(f"database {self.database}")
+            # In database mode only the role is left in the control database.
+            self.cursor.execute(RUN_OBJECTS_QUERY, {"name": self.name, "prefix": f"{self.name}\\_%"})
+            for kind, name in self.cursor.fetchall():
+                if self.drop(kind, name):
+                    self.dropped.append(f"{kind} {name}")
+            # Whichever run leaves last drops the shared extensions, even one
+            # in database mode that did not install them itself.
+            self.cursor.execute(SHARED_EXTENSIONS_QUERY, {"schema": EXTENSION_SCHEMA, "own": f"{self.name}%"})
+            others_live, shared, extensions = self.cursor.fetchone()
+            if shared and not others_live:
+                self.drop_shared(extensions)
+        except psycopg2.Error as e:
+            print(f"Sandbox teardown incomplete: {e}")
+        finally:
+            self.cursor.close()
+            if self.release is not None:
+                self.release(self.connection)
+            else:
+                self.connection.close()
+            self.teardown_ms = round((time.perf_counter() - start) * 1000, 2)
+        return self.report()
+
+    def drop_shared(self, extensions):
+        """Drop the extensions in the shared schema, then the schema; only called when no other sandbox exists."""
+        for extension in extensions:
+            if self.drop("extension", extension):
+                self.dropped.append(f"extension {extension}")
+        if self.execute(sql.SQL("DROP SCHEMA IF EXISTS {};").format(sql.Identifier(EXTENSION_SCHEMA)), f"schema {EXTENSION_SCHEMA}"):
+            self.dropped.append(f"schema {EXTENSION_SCHEMA}")
+
+    def report(self):
+        return {"mode": self.mode, "name": self.name, "setup_ms": self.setup_ms, "teardown_ms": self.teardown_ms,
+                "swept": self.swept, "dropped": self.dropped}
+
+
+def print_sandbox(report):
+    """One line on where the run happened and what setting up and cleaning up took."""
+    print(f"Sandbox {report['name']} ({report['mode']}): set up in {report['setup_ms']} ms, "
+          f"torn down in {report['teardown_ms']} ms, dropped {len(report['dropped'])} objects"
+          + (f", swept {len(report['swept'])} left behind by earlier runs." if report["swept"] else "."))
@@ -0,0 +1,252 @@
+import argparse
+import datetime
+import hashlib
+import json
+import os
+import re
+import sqlite3
+import sys
+import threading
+import time
+
+from tabulate import tabulate
+
+DEFAULT_STORE_FILE = "pci_results.db"
+IMPORTED_FEATURE_SET = "imported"  # Feature-set version recorded for reports whose probe code is unknown
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS runs (
+    id INTEGER PRIMARY KEY,
+    target TEXT NOT NULL,
+    recorded_at REAL NOT NULL,
+    feature_set TEXT NOT NULL,
+    pci_score REAL,
+    source TEXT,
+    content_hash TEXT,
+    UNIQUE (target, recorded_at, feature_set)
+);
+CREATE TABLE IF NOT EXISTS results (
+    run_id INTEGER NOT NULL REFERENCES runs (id),
+    category TEXT NOT NULL,
+    feature TEXT NOT NULL,
+    verdict TEXT NOT NULL,
+    wall_ms REAL,
+    PRIMARY KEY (run_id, category, feature)
+) WITHOUT ROWID;
+CREATE INDEX IF NOT EXISTS runs_by_target ON runs (target, recorded_at);
+CREATE INDEX IF NOT EXISTS results_by_feature ON results (feature, category, run_id);
+"""
+
+# Imported reports are keyed by target and a hash of their content, so a file
+# touched or checked out again is not imported twice, while targets whose
+# reports happen to be identical each keep theirs. Runs recorded live have no hash.
+CONTENT_INDEX = "CREATE UNIQUE INDEX IF NOT EXISTS runs_by_content ON runs (target, content_hash);"
+
+VERDICT_SCORE = "CASE {} WHEN 'full' THEN 1.0 WHEN 'partial' THEN 0.5 ELSE 0.0 END"
+
+# Targets whose latest run scores a feature worse than their run before it.
+# Both runs are found through runs_by_target and their verdicts by primary
+# key, so the cost grows with the number of targets, not with their history.
+REGRESSIONS_QUERY = """
+WITH latest AS (
+    SELECT targets.target,
+           (SELECT id FROM runs WHERE runs.target = targets.target ORDER BY recorded_at DESC LIMIT 1) AS run_id,
+           (SELECT id FROM runs WHERE runs.target = targets.target ORDER BY recorded_at DESC LIMIT 1 OFFSET 1) AS previous_run_id
+    FROM (SELECT DISTINCT target FROM runs) targets
+)
+SELECT latest.target, current.category, previous.verdict, current.verdict, runs.recorded_at
+FROM latest
+JOIN runs ON runs.id = latest.run_id
+JOIN results current ON current.run_id = latest.run_id AND current.feature = :feature
+JOIN results previous ON previous.run_id = latest.previous_run_id AND previous.category = current.category
+                     AND previous.feature = :feature
+WHERE (:category IS NULL OR current.category = :category) AND {} < {}
+ORDER BY latest.target;
+""".format(VERDICT_SCORE.format("current.verdict"), VERDICT_SCORE.format("previous.verdict"))
+
+
+def normalize_category(category):
+    """pci_autotest's DDL_features/SQL_features and pci_calculator's ddl_features/sql_features are the same categories."""
+    return category.lower()
+
+
+def shape_error(pci_score, verdicts, timings):
+    """Why a loaded report cannot be recorded, or None if its score, verdicts and timings have the expected shape."""
+    if pci_score is not None and (isinstance(pci_score, bool) or not isinstance(pci_score, (int, float))):
+        return f"score is {type(pci_score).__name__}, not a number"
+    if not isinstance(verdicts, dict) or not verdicts:
+        return "verdicts are not a {category: {feature: verdict}} object"
+    for category, subfeatures in verdicts.items():
+        if not isinstance(subfeatures, dict):
+            return f"category {category} is {type(subfeatures).__name__}, not a {{feature: verdict}} object"
+        for feature, verdict in subfeatures.items():
+            if not isinstance(verdict, str):
+                return f"verdict of {category} / {feature} is {type(verdict).__name__}, not a string"
+    if not any(verdicts.values()):
+        return "no feature verdicts"
+    if not isinstance(timings, dict) or not all(
+            isinstance(subfeatures, dict) and all(isinstance(timing, dict) for timing in subfeatures.values())
+            for subfeatures in timings.values()):
+        return "timings are not a {category: {feature: {...}}} object"
+    return None
+
+
+def load_report(path):
+    """
+    Read a report as (pci_score, verdicts, timings, content hash). Accepts
+    pci_autotest and fleet reports ({"pci_score", "details", "timings"}),
+    pci_calculator reports (a score line followed by the input JSON) and
+    bare feature files. Raises ValueError for anything else, e.g. a fleet
+    ranking or a result cache.
+    """
+    with open(path, "rb") as file:
+        content = file.read()
+    text = content.decode()
+    match = re.match(r"PostgreSQL Compatibility Index \(PCI\) Score: ([0-9.]+)%\n", text)
+    if match:
+        pci_score, verdicts, timings = float(match.group(1)), json.loads(text[match.end():]), {}
+    else:
+        report = json.loads(text)
+        if isinstance(report, dict) and "details" in report:
+            pci_score, verdicts, timings = report.get("pci_score"), report["details"], report.get("timings", {})
+        else:
+            pci_score, verdicts, timings = None, report, {}
+    error = shape_error(pci_score, verdicts, timings)
+    if error:
+        raise ValueError(f"not a PCI report: {error}")
+    return pci_score, verdicts, timings, hashlib.sha256(content).hexdigest()
+
+
+class ResultStore:
+    """
+    Append-only history of runs in SQLite: one row per run (target, time,
+    feature-set version, score) and one per feature verdict, indexed for
+    per-target history and per-feature lookups. Safe to share between threads.
+    """
+
+    def __init__(self, path=DEFAULT_STORE_FILE):
+        self.path = path
+        self.lock = threading.Lock()
+        self.connection = sqlite3.connect(path, check_same_thread=False)
+        self.connection.executescript(SCHEMA)
+        # Stores created before imports were keyed by content lack the column.
+        if "content_hash" not in [column[1] for column in self.connection.execute("PRAGMA table_info(runs);")]:
+            self.connection.execute("ALTER TABLE runs ADD COLUMN content_hash TEXT;")
+        self.connection.execute(CONTENT_INDEX)
+
+    def record(self, target, pci_score, pci_results, timings=None, feature_set=IMPORTED_FEATURE_SET, recorded_at=None,
+               source=None, content_hash=None):
+        """
+        Add one run; returns False if this target already has a run at
+        recorded_at for this feature set, or already has a run with this
+        content_hash.
+        """
+        timings = timings or {}
+        with self.lock, self.connection:
+            cursor = self.connection.execute(
+                "INSERT OR IGNORE INTO runs (target, recorded_at, feature_set, pci_score, source, content_hash) VALUES (?, ?, ?, ?, ?, ?);",
+                (target, time.time() if recorded_at is None else recorded_at, feature_set, pci_score, source, content_hash))
+            if cursor.rowcount == 0:
+                return False
+            self.connection.executemany(
+                "INSERT OR REPLACE INTO results (run_id, category, feature, verdict, wall_ms) VALUES (?, ?, ?, ?, ?);",
+                [(cursor.lastrowid, normalize_category(category), feature, verdict,
+                  timings.get(category, {}).get(feature, {}).get("wall_ms"))
+                 for category, subfeatures in pci_results.items() for feature, verdict in subfeatures.items()])
+        return True
+
+    def import_reports(self, paths):
+        """
+        Import report files, or every .json/.txt report in a directory, named
+        after the file and dated by its modification time. Importing a file
+        whose content is already in the store for its target adds nothing,
+        however often it was touched or checked out; files that are not reports are skipped
+        with a message. Returns (imported, skipped).
+        """
+        files = []
+        for path in paths:
+            if os.path.isdir(path):
+                files.extend(os.path.join(path, name) for name in sorted(os.listdir(path)) if name.endswith((".json", ".txt")))
+            else:
+                files.append(path)
+        imported = skipped = 0
+        for path in files:
+            try:
+                pci_score, pci_results, timings, content_hash = load_report(path)
+            except (OSError, ValueError) as e:
+                print(f"Skipping {path}: {e}")
+                skipped += 1
+                continue
+            target = os.path.splitext(os.path.basename(path))[0]
+            if self.record(target, pci_score, pci_results, timings, recorded_at=os.path.getmtime(path), source=path,
+                           content_hash=content_hash):
+                imported += 1
+            else:
+                skipped += 1
+        return imported, skipped
+
+    def history(self, target):
+        """[(recorded_at, feature_set, pci_score)] for a target, oldest first."""
+        with self.lock:
+            return self.connection.execute(
+                "SELECT recorded_at, feature_set, pci_score FROM runs WHERE target = ? ORDER BY recorded_at;", (target,)).fetchall()
+
+    def latest(self):
+        """[(target, recorded_at, pci_score)] for each target's latest run, highest score first."""
+        with self.lock:
+            return self.connection.execute(
+                "SELECT target, MAX(recorded_at), pci_score FROM runs GROUP BY target ORDER BY pci_score IS NULL, pci_score DESC, target;"
+            ).fetchall()
+
+    def regressions(self, feature, category=None):
+        """[(target, category, previous verdict, latest verdict, recorded_at)] where a target's latest verdict is worse."""
+        with self.lock:
+            return self.connection.execute(
+                REGRESSIONS_QUERY, {"feature": feature, "category": category and normalize_category(category)}).fetchall()
+
+    def close(self):
+        self.connection.close()
+
+
+def format_time(timestamp):
+    return datetime.datetime.fromtimestamp(timestamp).strftime("%Y-%m-%d %H:%M:%S")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Query and import the local PCI results store.")
+    parser.add_argument("--store", default=DEFAULT_STORE_FILE, help=f"Results store location (default: {DEFAULT_STORE_FILE}).")
+    commands = parser.add_subparsers(dest="command", required=True)
+    importer = commands.add_parser("import", help="Import report files or directories of reports, e.g. outputs/.")
+    importer.add_argument("paths", nargs="+")
+    history = commands.add_parser("history", help="Score history of one target.")
+    history.add_argument("target")
+    commands.add_parser("latest", help="Latest score of every target.")
+    regressions = commands.add_parser("regressions", help="Targets whose latest verdict on a feature is worse than the one before.")
+    regressions.add_argument("feature", help="Feature name, e.g. Triggers.")
+    regressions.add_argument("--category", help="Only this category, e.g. procedural_features.")
+    args = parser.parse_args()
+
+    store = ResultStore(args.store)
+    try:
+        if args.command == "import":
+            imported, skipped = store.import_reports(args.paths)
+            print(f"Imported {imported} reports ({skipped} skipped) into {args.store}.")
+        elif args.command == "history":
+            rows = [(format_time(recorded_at), feature_set, pci_score) for recorded_at, feature_set, pci_score in store.history(args.target)]
+            print(tabulate(rows, headers=["Recorded", "Feature Set", "PCI Score"], tablefmt="grid"))
+        elif args.command == "latest":
+            rows = [(target, format_time(recorded_at), pci_score) for target, recorded_at, pci_score in store.latest()]
+            print(tabulate(rows, headers=["Target", "Recorded", "PCI Score"], tablefmt="grid"))
+        else:
+            rows = [(target, category, previous, latest, format_time(recorded_at))
+                    for target, category, previous, latest, recorded_at in store.regressions(args.feature, args.category)]
+            print(tabulate(rows, headers=["Target", "Category", "Previous", "Latest", "Recorded"], tablefmt="grid"))
+    except (OSError, sqlite3.Error) as e:
+        print(f"Error: {e}")
+        sys.exit(1)
+    finally:
+        store.close()
+
+
+if __name__ == "__main__":
+    main()